@@ -0,0 +1,70 @@
+#!/usr/bin/python
+# This benchmarks the polygon fill engines of the Drawing class against each
+# other on the torus and sphere meshes from the Generator class.
+# Author: alvin.lin.dev@gmail.com (Alvin Lin)
+
+from graphics.lib.color import Color
+from graphics.lib.drawing import Drawing
+from graphics.lib.generator import Generator
+from graphics.lib.rasterizer import Rasterizer
+from graphics.lib.vector import Vector
+
+from time import time
+
+import argparse
+
+def benchmark(fill_engine, mesh, size, repeat):
+    """
+    Returns the average time it takes to fill the given mesh, the average time
+    spent rasterizing the mesh alone, and the number of pixels that were drawn.
+
+    Parameters:
+    fill_engine: str, the fill engine to benchmark
+    mesh: PolygonMatrix, the mesh to fill, centered at the origin
+    size: int, the width and height of the drawing
+    repeat: int, the number of times to fill the mesh
+    """
+    drawing = Drawing(size, size, fill_engine=fill_engine)
+    drawing.set_view_vector(Vector())
+    drawing.translate(size / 2, size / 2, 0)
+    drawing.rotate_x(30)
+    drawing.rotate_z(45)
+    start_time = time()
+    for i in range(repeat):
+        drawing.clear()
+        drawing.fill_polygonmatrix(mesh.copy(), Color.RED())
+    elapsed = (time() - start_time) / repeat
+    triangles = (mesh * drawing.get_transformation()).cull_faces(
+        drawing.view_vector).get_rounded()._matrix().reshape(-1, 3, 4)[:, :, :3]
+    start_time = time()
+    for i in range(repeat):
+        if fill_engine == "halfspace":
+            Rasterizer.rasterize_blocks(triangles, bounds=[size, size])
+        else:
+            Rasterizer.rasterize_spans(triangles)
+    rasterize_elapsed = (time() - start_time) / repeat
+    return (elapsed, rasterize_elapsed,
+            (drawing.picture.grid != 255).any(axis=2).sum())
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--size", type=int, default=512)
+    argparser.add_argument("--repeat", type=int, default=5)
+    args = argparser.parse_args()
+
+    scale = args.size / 512.0
+    meshes = {
+        "torus": Generator.get_torus_polygonmatrix(
+            0, 0, 0, 40 * scale, 160 * scale),
+        "sphere": Generator.get_sphere_polygonmatrix(0, 0, 0, 180 * scale)
+    }
+    for name in sorted(meshes):
+        for fill_engine in Drawing.FILL_ENGINES:
+            (elapsed, rasterize_elapsed, pixels) = benchmark(
+                fill_engine, meshes[name], args.size, args.repeat)
+            print "%-8s %-10s fill %8.2f ms  rasterize %8.2f ms %10d pixels" % (
+                name, fill_engine, elapsed * 1000, rasterize_elapsed * 1000,
+                pixels)
+
+if __name__ == "__main__":
+    main()
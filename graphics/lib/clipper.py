@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# This class holds static methods that clip batches of lines against the
+# viewport before they are rasterized, so that no work is spent on pixels that
+# are offscreen. Triangles are not clipped, since the rasterizers already limit
+# them to the rows and columns of the viewport.
+# Author: alvin.lin.dev@gmail.com (Alvin Lin)
+
+from __future__ import division
+
+from rasterizer import Rasterizer
+
+import numpy as np
+
+class Clipper():
+
+    # The tolerance used when rounding the clipped ranges of lines to steps.
+    EPSILON = 1e-9
+
+    @staticmethod
+    def clip_lines(starts, ends, bounds, origin=(0, 0), first_steps=None):
+        """
+        Clips the given lines against the viewport using the Liang-Barsky
+        algorithm. Lines that are entirely offscreen are removed, and the
+        endpoints of the remaining lines are returned along with the first and
+        last steps of each line that are onscreen, see
+        Rasterizer.rasterize_lines(). Clipping by steps instead of moving the
+        endpoints means the pixels of a clipped line are exactly the onscreen
+        pixels of the original line. The viewport extends half a pixel past
+        the centers of the pixels on its edges, since points there still round
+        onto the raster.
+
+        Parameters:
+        starts: numpy.ndarray, an Nx3 array of the first endpoints of the lines
+        ends: numpy.ndarray, an Nx3 array of the second endpoints of the lines
+        bounds: list, the width and height of the viewport
+        origin: list (optional), the x and y coordinates of the top left
+            corner of the viewport, defaults to the origin
+        first_steps: numpy.ndarray (optional), the first step of each line
+            that should be kept even if it is onscreen, defaults to 0
+        """
+        deltas = ends - starts
+        (x, y) = (starts[:, 0] - origin[0], starts[:, 1] - origin[1])
+        (width, height) = bounds
+        # Each line is parametrized as start + t * delta, and each side of the
+        # viewport limits t to one side of the point where the line crosses it.
+        p = np.array([-deltas[:, 0], deltas[:, 0],
+                      -deltas[:, 1], deltas[:, 1]])
+        q = np.array([x + 0.5, width - 0.5 - x, y + 0.5, height - 0.5 - y])
+        t = q / np.where(p == 0, 1, p)
+        t0 = np.where(p < 0, t, 0).max(axis=0)
+        t1 = np.where(p > 0, t, 1).min(axis=0)
+        steps = Rasterizer.get_line_steps(starts, ends)
+        onscreen_steps = np.ceil(t0 * steps - Clipper.EPSILON).astype(np.int64)
+        if first_steps is None:
+            first_steps = onscreen_steps
+        else:
+            first_steps = np.maximum(first_steps, onscreen_steps)
+        last_steps = np.floor(t1 * steps + Clipper.EPSILON).astype(np.int64)
+        keep = (first_steps <= last_steps) & ~(
+            (p == 0) & (q < 0)).any(axis=0)
+        return (starts[keep], ends[keep], first_steps[keep], last_steps[keep])
+
+if __name__ == "__main__":
+    print Clipper.clip_lines(np.array([[-5., 2, 0], [1, 1, 1]]),
+                             np.array([[15., 2, 20], [-1, -1, -1]]), [10, 10])
@@ -1,38 +1,73 @@
 #!/usr/bin/python
 # Author: Alvin Lin (alvin.lin.dev@gmail.com)
 # This is a class that manages colors for the Picture and Drawing class.
+# Colors are immutable and interned, so constructing the same color twice
+# returns the same object and colors can be passed around without allocating.
 
+import numpy as np
 import random
 
-class Color:
+class Color(object):
 
-    def __init__(self, color):
+    __slots__ = ("color", "packed", "array")
+
+    # Maps hex codes and packed 24-bit RGB values to their interned Colors.
+    _interned = {}
+    _hex_cache = {}
+
+    def __new__(cls, color):
         """
         Constructor for the Color class.
 
         Parameters:
         color: str or list, the hexadecimal or rgb representation of the color
         """
-        if type(color) is list and len(color) == 3:
-            self.color = color
-        elif type(color) is str:
-            self.color = self._hex_to_rgb(color)
-        else:
-            raise TypeError(
-                "Invalid color, only hex or a list of RGB values are allowed.")
+        if type(color) is str:
+            interned = Color._interned.get(color)
+            if interned is None:
+                interned = Color._interned[color] = Color._intern(
+                    Color._hex_to_rgb(color))
+            return interned
+        elif type(color) in (list, tuple) and len(color) == 3:
+            return Color._intern(color)
+        raise TypeError(
+            "Invalid color, only hex or a list of RGB values are allowed.")
+
+    @staticmethod
+    def _intern(rgb):
+        """
+        Returns the interned Color with the given rgb values, creating it if
+        it does not exist yet.
+
+        Parameters:
+        rgb: list, the rgb values of the color, from 0 to 255
+        """
+        (r, g, b) = rgb
+        if not all([isinstance(x, (int, long)) and 0 <= x <= 255 for x in rgb]):
+            raise TypeError("%s is not a valid list of RGB values" % rgb)
+        packed = (r << 16) | (g << 8) | b
+        color = Color._interned.get(packed)
+        if color is None:
+            color = object.__new__(Color)
+            color.color = (r, g, b)
+            color.packed = packed
+            color.array = np.array(color.color, dtype=np.uint8)
+            color.array.flags.writeable = False
+            Color._interned[packed] = color
+        return color
 
     @staticmethod
     def random():
         """
         Returns a randomly generated color.
         """
-        return Color([random.randint(0, 256) for x in range(3)])
+        return Color([random.randint(0, 255) for x in range(3)])
 
     @staticmethod
     def _hex_to_rgb(hex_code):
         """
         Given the hexdecimal representation of a color, this returns the rgb
-        representation of the given color.
+        representation of the given color. Results are cached.
 
         Parameters:
         hex_code: str, the hex code to convert to rgb
@@ -40,10 +75,14 @@ class Color:
         http://stackoverflow.com/questions/214359/
         converting-hex-color-to-rgb-and-vice-versa
         """
-        hex_code = hex_code.lstrip("#")
-        lv = len(hex_code)
-        return [
-            int(hex_code[i:i + lv // 3], 16) for i in range(0, lv, lv // 3)]
+        rgb = Color._hex_cache.get(hex_code)
+        if rgb is None:
+            stripped = hex_code.lstrip("#")
+            lv = len(stripped)
+            rgb = Color._hex_cache[hex_code] = tuple([
+                int(stripped[i:i + lv // 3], 16)
+                for i in range(0, lv, lv // 3)])
+        return rgb
 
     @staticmethod
     def BLACK():
@@ -65,15 +104,30 @@ class Color:
     def BLUE():
         return Color("0000FF")
 
+    def to_bytes(self):
+        """
+        Returns the RGB values of this color in the byte layout of the
+        Picture raster.
+        """
+        return self.array.tobytes()
+
     def __iter__(self):
-        for c in self.color:
-            yield c
+        return iter(self.color)
 
     def __str__(self):
-        return str(self.color)
+        return str(list(self.color))
 
     def __len__(self):
-        return len(self.color)
+        return 3
+
+    def __eq__(self, other):
+        return isinstance(other, Color) and self.packed == other.packed
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self.packed
 
     def __add__(self, other):
         if isinstance(other, (list, Color)) and len(other) == 3:
@@ -93,10 +147,8 @@ class Color:
         raise IndexError("Index out of range.")
 
     def __setitem__(self, index, value):
-        if index >= 0 and index <= 2:
-            self.color[index] = value
-        raise IndexError("Index out of range.")
+        raise TypeError("Colors are immutable.")
 
 if __name__ == "__main__":
     a = Color("FF0000")
-    print Color.BLACK()
+    print Color.BLACK(), Color.RED() is a
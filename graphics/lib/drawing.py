@@ -1,129 +1,299 @@
 #!/usr/bin/python
 # This is a class abstracting the Transformation and Picture classes into a
 # general Drawing class.
-# ImageMagick must be installed for the generate() and display() methods to
-# work.
+# ImageMagick must be installed for the display() method and for generating
+# image formats other than ppm and png.
 # Author: Alvin Lin (alvin.lin.dev@gmail.com)
 
+from clipper import Clipper
 from color import Color
 from generator import Generator
-from matrix import Matrix, TransformationMatrix, EdgeMatrix, PolygonMatrix
+from matrix import Matrix, TransformationMatrix, EdgeMatrix, PolylineMatrix
+from matrix import PolygonMatrix
 from picture import Picture
+from rasterizer import Rasterizer
+from tiler import TileRasterizer
+from transformstack import TransformStack
 from util import Util
 from vector import Vector
+from zbuffer import ZBuffer
 
 from math import pi
 from os import system, remove
 
+import numpy as np
+
 class Drawing():
 
-    def __init__(self, width, height):
+    FILL_ENGINES = ["scanline", "halfspace"]
+
+    def __init__(self, width, height, mapped_file=None, fill_engine="scanline",
+                 processes=1, deferred=False):
         """
         Constructors for the Drawing class.
 
         Parameters:
         width: int, the width of the image in pixels
         height: int, the height of the image in pixels
-        """
+        mapped_file: str (optional), the name of a binary ppm file, excluding
+            the extension, to memory map the internal raster onto
+        fill_engine: str (optional), the rasterizer used to fill polygons,
+            either scanline or halfspace, defaults to scanline
+        processes: int (optional), the number of processes to rasterize lines
+            and polygons with, split by screen tiles, defaults to 1, which
+            rasterizes them in this process
+        deferred: bool (optional), when set to True, draw calls are recorded
+            and only drawn when flush() is called, see set_deferred()
+        """
+        self.set_fill_engine(fill_engine)
         self.width = width
         self.height = height
-        self.picture = Picture(width, height)
-        self.pixel_depths = [[float("-inf") for x in range(
-            width)] for y in range(height)]
-        self.matrix_stack = [TransformationMatrix.identity()]
+        shared = processes > 1
+        self.picture = Picture(width, height, mapped_file=mapped_file,
+                               shared=shared)
+        self.pixel_depths = ZBuffer(width, height, shared=shared)
+        self.tiler = None
+        if shared:
+            self.tiler = TileRasterizer(
+                self.picture, self.pixel_depths, processes)
+        self.matrix_stack = TransformStack()
         self.view_vector = None
+        self.deferred = deferred
+        self.commands = []
+
+    def _set_pixels(self, xs, ys, z_depths, color):
+        """
+        Sets pixels on the internal raster with reference to the original
+        origin (ignoring the current TransformationMatrix) if they pass the
+        depth test. Pixels that are out of bounds are discarded, and if a pixel
+        appears more than once, only its nearest occurrence is drawn.
+
+        Parameters:
+        xs: numpy.ndarray, the x coordinates of the pixels to set
+        ys: numpy.ndarray, the y coordinates of the pixels to set
+        z_depths: numpy.ndarray, the depths of the pixels
+        color: Color, the color to set the pixels to
+        """
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (
+            ys < self.height)
+        (xs, ys, z_depths) = (xs[inside], ys[inside], z_depths[inside])
+        if len(xs) == 0:
+            return
+        (xs, ys, z_depths) = Rasterizer.get_nearest_pixels(
+            xs, ys, z_depths, self.width)
+        passed = self.pixel_depths.test_and_set_pixels(xs, ys, z_depths)
+        self.picture.set_pixels(xs[passed], ys[passed], color)
+
+    def _draw_lines(self, starts, ends, color, first_steps=None):
+        """
+        Draws a batch of lines on the internal raster with reference to the
+        original origin (ignoring the current TransformationMatrix). The depth
+        of each pixel is interpolated between the endpoints of its line. Lines
+        are clipped to the raster before they are rasterized.
+
+        Parameters:
+        starts: numpy.ndarray, an Nx3 array of the first endpoints of the lines
+        ends: numpy.ndarray, an Nx3 array of the second endpoints of the lines
+        color: Color, the color of the lines
+        first_steps: numpy.ndarray (optional), the first step of each line to
+            draw, see Rasterizer.rasterize_lines()
+        """
+        if self.tiler:
+            if len(starts):
+                self.tiler.rasterize_lines(starts, ends, color, first_steps)
+            return
+        (starts, ends, first_steps, last_steps) = Clipper.clip_lines(
+            starts, ends, [self.width, self.height], first_steps=first_steps)
+        if len(starts):
+            self._set_pixels(*Rasterizer.rasterize_lines(
+                starts, ends, first_steps, last_steps), color=color)
+
+    @staticmethod
+    def _get_polyline_segments(points):
+        """
+        Returns the segments of a strip of lines as arrays of their first and
+        second endpoints, and the first step of each segment. Every segment
+        after the first starts one step in, since its first point was already
+        drawn as the last point of the segment before it.
+
+        Parameters:
+        points: numpy.ndarray, an Nx3 array of the points of the strip
+        """
+        first_steps = np.ones(max(len(points) - 1, 0), dtype=np.int64)
+        first_steps[:1] = 0
+        return (points[:-1], points[1:], first_steps)
 
-    def _set_pixel(self, x, y, color, suppress_error=True,
-                   z_depth=float("-inf")):
-        """
-        Sets a pixel on the internal raster with reference to the original
-        origin (ignoring the current TransformationMatrix).
-
-        Parameters:
-        x: int, the x coordinate of the pixel to set
-        y: int, the y coordinate of the pixel to set
-        color: Color, the color to set the pixel to
-        suppress_error: bool (optional), when set to True, will suppress
-        the error if the pixel is out of bounds
-        z_depth: float (optional), the depth of the pixel, if this pixel is
-        lower in depth than the current pixel, then it will not be drawn
-        """
-        # The coordinates are reversed because of the way lists of lists
-        # work in Python.
-        try:
-            if z_depth >= self.pixel_depths[y][x]:
-                self.pixel_depths[y][x] = z_depth
-                self.picture.set_pixel(x, y, color)
-        except IndexError, exception:
-            if not suppress_error:
-                raise exception
-
-    def _draw_line(self, x1, y1, x2, y2, color, z_depth=float("-inf")):
-        """
-        Uses the Bresenham line algorithm to draw a line on the internal
-        raster with reference to the original origin (ignoring the current
-        TransformationMatrix)
-
-        Parameters:
-        x1: int, the x coordinate of one endpoint of the line
-        y1: int, the y coordinate of one endpoint of the line
-        x2: int, the x coordinate of the other endpoint of the line
-        y2: int, the y coordinate of the other endpoint of the line
-        color: Color, the color of the line
-        z_depth: float (optional), the depth of the line, if this line is lower
-        in depth than the pixels that it goes over, then it will not be drawn
-        """
-        dx = x2 - x1
-        dy = y2 - y1
-        if dx + dy < 0:
-            dx *= -1
-            dy *= -1
-            x1, x2 = x2, x1
-            y1, y2 = y2, y1
-        if dx == 0:
-            while y1 <= y2:
-                self._set_pixel(x1, y1, color, z_depth=z_depth)
-                y1 += 1
-        elif dy == 0:
-            while x1 <= x2:
-                self._set_pixel(x1, y1, color, z_depth=z_depth)
-                x1 += 1
-        elif dy < 0:
-            d = 0
-            while x1 <= x2:
-                self._set_pixel(x1, y1, color, z_depth=z_depth)
-                if d > 0:
-                    y1 += -1
-                    d += -dx
-                x1 += 1
-                d += -dy
-        elif dx < 0:
-            d = 0
-            while y1 <= y2:
-                self._set_pixel(x1, y1, color, z_depth=z_depth)
-                if d > 0:
-                    x1 += -1
-                    d += -dy
-                y1 += 1
-                d += -dx
-        elif dx > dy:
-            d = 0
-            while x1 <= x2:
-                self._set_pixel(x1, y1, color, z_depth=z_depth)
-                if d > 0:
-                    y1 += 1
-                    d += -dx
-                x1 += 1
-                d += dy
+    def _draw_points(self, points, color):
+        """
+        Draws a batch of points on the internal raster with reference to the
+        original origin (ignoring the current TransformationMatrix).
+
+        Parameters:
+        points: numpy.ndarray, an Nx3 array of the rounded points
+        color: Color, the color of the points
+        """
+        self._set_pixels(points[:, 0].astype(np.int64),
+                         points[:, 1].astype(np.int64), points[:, 2], color)
+
+    def _draw_triangles(self, triangles, color):
+        """
+        Draws the edges of a batch of triangles on the internal raster with
+        reference to the original origin (ignoring the current
+        TransformationMatrix). Edges shared by more than one triangle are only
+        drawn once.
+
+        Parameters:
+        triangles: numpy.ndarray, an Nx3x3 array of the rounded corners of the
+            triangles
+        color: Color, the color of the edges
+        """
+        triangles = self._remove_hidden(triangles)
+        corners = [triangles[:, 0], triangles[:, 1], triangles[:, 2]]
+        (starts, ends) = (np.concatenate(corners),
+                          np.concatenate(corners[1:] + corners[:1]))
+        if len(starts) == 0:
+            return
+        # Neighboring triangles share their edges, so each edge is keyed on
+        # its endpoints in sorted order and only its first occurrence is
+        # drawn.
+        deltas = ends - starts
+        first_differences = np.argmax(deltas != 0, axis=1)
+        swap = deltas[np.arange(len(deltas)), first_differences] < 0
+        keys = np.where(swap[:, np.newaxis], np.hstack([ends, starts]),
+                        np.hstack([starts, ends]))
+        unique = np.sort(np.unique(keys, axis=0, return_index=True)[1])
+        self._draw_lines(starts[unique], ends[unique], color)
+
+    def _fill_triangles(self, triangles, color):
+        """
+        Fills a batch of triangles on the internal raster with reference to
+        the original origin (ignoring the current TransformationMatrix).
+
+        Parameters:
+        triangles: numpy.ndarray, an Nx3x3 array of the rounded corners of the
+            triangles
+        color: Color, the color to fill the triangles with
+        """
+        triangles = self._remove_hidden(triangles)
+        if self.tiler:
+            if len(triangles):
+                self.tiler.rasterize_triangles(
+                    triangles, color, self.fill_engine)
+            return
+        if len(triangles) == 0:
+            return
+        if self.fill_engine == "halfspace":
+            pixels = Rasterizer.rasterize_blocks(
+                triangles, bounds=[self.width, self.height])
         else:
-            d = 0
-            while y1 <= y2:
-                self._set_pixel(x1, y1, color, z_depth=z_depth)
-                if d > 0:
-                    x1 += 1
-                    d += -dy
-                y1 += 1
-                d += dx
+            pixels = Rasterizer.rasterize_spans(
+                triangles, bounds=[self.width, self.height])
+        self._set_pixels(*pixels, color=color)
+
+    def _record(self, kind, matrix, color):
+        """
+        Records a draw call in deferred mode along with the current
+        TransformationMatrix and view vector.
+
+        Parameters:
+        kind: str, the kind of draw call, either points, edges, polylines,
+            polygons, or fills
+        matrix: Matrix, the untransformed matrix to draw
+        color: Color, the color to draw the matrix with
+        """
+        # The points are recorded as they are along with their pending
+        # transformation, so they are only transformed once when flushed.
+        matrix = matrix * self.matrix_stack.get_top()
+        self.commands.append((kind, matrix.matrix, matrix.transformation,
+                              color, self.view_vector))
+
+    def set_deferred(self, deferred):
+        """
+        Turns deferred mode on or off. In deferred mode, draw calls are
+        recorded instead of drawn, and are drawn all at once by flush(). Any
+        recorded draw calls are flushed when deferred mode is turned off.
+
+        Parameters:
+        deferred: bool, True to record draw calls, False to draw them
+            immediately
+        """
+        if not deferred:
+            self.flush()
+        self.deferred = deferred
+
+    def flush(self):
+        """
+        Draws all the draw calls recorded in deferred mode. The points of the
+        draw calls recorded under the same TransformationMatrix are
+        transformed together, faces are culled, and consecutive draw calls of
+        the same kind and color are merged and rasterized as a single batch,
+        so the nearest pixels are resolved once per batch. The result is the
+        same as drawing them one at a time.
+        """
+        if not self.commands:
+            return
+        (commands, self.commands) = (self.commands, [])
+        groups = {}
+        for (index, command) in enumerate(commands):
+            groups.setdefault(command[2].tobytes(), []).append(index)
+        transformed = [None] * len(commands)
+        for indices in groups.values():
+            counts = [len(commands[index][1]) for index in indices]
+            points = np.dot(
+                np.concatenate([commands[index][1] for index in indices]),
+                commands[indices[0]][2])
+            for (index, points) in zip(indices, np.split(
+                    points[:, :3], np.cumsum(counts)[:-1])):
+                transformed[index] = points
+        batches = []
+        for (command, points) in zip(commands, transformed):
+            (kind, color, view_vector) = (command[0], command[3], command[4])
+            first_steps = None
+            if kind in ["polygons", "fills"]:
+                points = points.reshape(-1, 3, 3)
+                if view_vector:
+                    points = PolygonMatrix.get_visible_faces(
+                        points, view_vector)
+                points = Matrix.round_points(points)
+            elif kind == "edges":
+                points = Matrix.round_points(points).reshape(-1, 2, 3)
+                first_steps = np.zeros(len(points), dtype=np.int64)
+            elif kind == "polylines":
+                # Strips are drawn as edges, so that they can be merged with
+                # other edges and strips.
+                (starts, ends, first_steps) = Drawing._get_polyline_segments(
+                    Matrix.round_points(points))
+                (kind, points) = ("edges", np.stack([starts, ends], axis=1))
+            else:
+                points = Matrix.round_points(points)
+            if batches and batches[-1][:2] == (kind, color):
+                batches[-1][2].append(points)
+                batches[-1][3].append(first_steps)
+            else:
+                batches.append((kind, color, [points], [first_steps]))
+        for (kind, color, points, first_steps) in batches:
+            points = np.concatenate(points)
+            if kind == "points":
+                self._draw_points(points, color)
+            elif kind == "edges":
+                self._draw_lines(points[:, 0], points[:, 1], color,
+                                 np.concatenate(first_steps))
+            elif kind == "polygons":
+                self._draw_triangles(points, color)
+            else:
+                self._fill_triangles(points, color)
+
+    def set_fill_engine(self, fill_engine):
+        """
+        Sets the rasterizer used to fill polygons.
+
+        Parameters:
+        fill_engine: str, scanline to fill polygons row by row, or halfspace to
+            fill them block by block using edge functions
+        """
+        if fill_engine not in Drawing.FILL_ENGINES:
+            raise ValueError("%s is not a valid fill engine" % fill_engine)
+        self.fill_engine = fill_engine
 
     def set_view_vector(self, view_vector):
         if not isinstance(view_vector, Vector):
@@ -135,21 +305,36 @@ class Drawing():
         Pushes a copy of the current TransformationMatrix to the top of the
         stack.
         """
-        self.matrix_stack.append(self.get_transformation())
+        self.matrix_stack.push()
 
     def pop_matrix(self):
         """
-        Pops the current TransformationMatrix from the top of the stack.
+        Pops the current TransformationMatrix from the top of the stack. If it
+        is the only one on the stack, it is reset to the identity matrix.
         """
-        if len(self.matrix_stack) == 1:
-            self.matrix_stack = [TranformationMatrix.identity()]
         self.matrix_stack.pop()
 
     def get_transformation(self):
         """
         Returns the current TransformationMatrix on the stack.
         """
-        return self.matrix_stack[-1].copy()
+        return self.matrix_stack.get_top().copy()
+
+    def get_inverse_transformation(self):
+        """
+        Returns the inverse of the current TransformationMatrix on the stack.
+        It is cached until the current TransformationMatrix changes.
+        """
+        return TransformationMatrix(self.matrix_stack.get_inverse())
+
+    def get_normal_matrix(self):
+        """
+        Returns a read only 3x3 numpy array that transforms row vector normals
+        by the current TransformationMatrix on the stack, which is the inverse
+        transpose of its linear part. It is cached until the current
+        TransformationMatrix changes.
+        """
+        return self.matrix_stack.get_normal_matrix()
 
     def apply_transformation(self, matrix):
         """
@@ -161,14 +346,15 @@ class Drawing():
         """
         if not isinstance(matrix, TransformationMatrix):
             raise TypeError("%s is not a TransformationMatrix" % matrix)
-        self.matrix_stack[-1] *= matrix
+        top = self.matrix_stack.modify_top()
+        top *= matrix
 
     def identity(self):
         """
         Sets the current TransformationMatrix on the stack to the identity
         matrix.
         """
-        self.matrix_stack[-1] = TransformationMatrix.identity()
+        self.matrix_stack.set_top(TransformationMatrix.identity())
 
     def rotate(self, axis, theta, radians=False):
         """
@@ -202,7 +388,7 @@ class Drawing():
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        self.matrix_stack[-1].rotate_x(theta, radians=radians)
+        self.matrix_stack.modify_top().rotate_x(theta, radians=radians)
 
     def rotate_x_about_point(self, theta, x, y, z, radians=False):
         """
@@ -219,8 +405,8 @@ class Drawing():
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        self.matrix_stack[-1].rotate_x_about_point(theta, x, y, z,
-                                                   radians=radians)
+        self.matrix_stack.modify_top().rotate_x_about_point(
+            theta, x, y, z, radians=radians)
 
     def rotate_y(self, theta, radians=False):
         """
@@ -233,7 +419,7 @@ class Drawing():
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        self.matrix_stack[-1].rotate_y(theta, radians=radians)
+        self.matrix_stack.modify_top().rotate_y(theta, radians=radians)
 
     def rotate_y_about_point(self, theta, x, y, z, radians=False):
         """
@@ -250,8 +436,8 @@ class Drawing():
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        self.matrix_stack[-1].rotate_y_about_point(theta, x, y, z,
-                                                   radians=radians)
+        self.matrix_stack.modify_top().rotate_y_about_point(
+            theta, x, y, z, radians=radians)
 
     def rotate_z(self, theta, radians=False):
         """
@@ -264,7 +450,7 @@ class Drawing():
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        self.matrix_stack[-1].rotate_z(theta, radians=radians)
+        self.matrix_stack.modify_top().rotate_z(theta, radians=radians)
 
     def rotate_z_about_point(self, theta, x, y, z, radians=False):
         """
@@ -281,8 +467,8 @@ class Drawing():
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        self.matrix_stack[-1].rotate_z_about_point(theta, x, y, z,
-                                                   radians=radians)
+        self.matrix_stack.modify_top().rotate_z_about_point(
+            theta, x, y, z, radians=radians)
 
     def translate(self, x, y, z):
         """
@@ -293,7 +479,7 @@ class Drawing():
         y: int, the amount to translate in the y direction
         z: int, the amount to translate in the z direction
         """
-        self.matrix_stack[-1].translate(x, y, z)
+        self.matrix_stack.modify_top().translate(x, y, z)
 
     def scale(self, x, y, z):
         """
@@ -305,12 +491,13 @@ class Drawing():
         y: int or float, the amount to scale in the y direction
         z: int or float, the amount to scale in the z direction
         """
-        self.matrix_stack[-1].scale(x, y, z)
+        self.matrix_stack.modify_top().scale(x, y, z)
 
     def draw_pointmatrix(self, matrix, color=Color.BLACK()):
         """
         Draws the given Matrix of points onto the internal raster after
-        applying the current TransformationMatrix on the stack.
+        applying the current TransformationMatrix on the stack. Points are
+        depth tested against everything else that has been drawn.
 
         Parameters:
         matrix: Matrix, the matrix of points to draw
@@ -318,8 +505,12 @@ class Drawing():
         """
         if not isinstance(matrix, Matrix):
             raise TypeError("%s is not a Matrix" % matrix)
-        for point in (matrix * self.get_transformation()).get_rounded():
-            self._set_pixel(point[0], point[1], color)
+        if self.deferred:
+            self._record("points", matrix, color)
+            return
+        matrix = (matrix * self.matrix_stack.get_top()).get_rounded()
+        points = matrix._matrix()[:, :3]
+        self._draw_points(points, color)
 
     def draw_edgematrix(self, matrix, color=Color.BLACK()):
         """
@@ -332,9 +523,51 @@ class Drawing():
         """
         if not isinstance(matrix, EdgeMatrix):
             raise TypeError("%s is not an EdgeMatrix" % matrix)
-        for edge in (matrix * self.get_transformation()).get_rounded():
-            self._draw_line(
-                edge[0][0], edge[0][1], edge[1][0], edge[1][1], color)
+        if self.deferred:
+            self._record("edges", matrix, color)
+            return
+        matrix = (matrix * self.matrix_stack.get_top()).get_rounded()
+        points = matrix._matrix()[:, :3]
+        self._draw_lines(points[0::2], points[1::2], color)
+
+    def draw_polylinematrix(self, matrix, color=Color.BLACK()):
+        """
+        Draws the given PolylineMatrix onto the internal raster as a connected
+        strip of lines after applying the current TransformationMatrix on the
+        stack. The point shared by consecutive lines is only drawn once.
+
+        Parameters:
+        matrix: PolylineMatrix, the strip of lines to draw
+        color: Color (optional), the color to draw the matrix with
+        """
+        if not isinstance(matrix, PolylineMatrix):
+            raise TypeError("%s is not a PolylineMatrix" % matrix)
+        if self.deferred:
+            self._record("polylines", matrix, color)
+            return
+        matrix = (matrix * self.matrix_stack.get_top()).get_rounded()
+        points = matrix._matrix()[:, :3]
+        (starts, ends, first_steps) = Drawing._get_polyline_segments(points)
+        if len(starts):
+            self._draw_lines(starts, ends, color, first_steps)
+
+    def _remove_hidden(self, triangles):
+        """
+        Returns the given triangles without the ones that are entirely behind
+        what has already been drawn, using the bounding box and nearest depth
+        of each triangle.
+
+        Parameters:
+        triangles: numpy.ndarray, an Nx3x3 array of the corners of the
+            triangles
+        """
+        if len(triangles) == 0:
+            return triangles
+        low = np.floor(triangles.min(axis=1))
+        high = np.ceil(triangles.max(axis=1))
+        hidden = self.pixel_depths.get_hidden(
+            low[:, 0], low[:, 1], high[:, 0], high[:, 1], high[:, 2])
+        return triangles[~hidden]
 
     def draw_polygonmatrix(self, matrix, color=Color.BLACK()):
         """
@@ -349,19 +582,14 @@ class Drawing():
         """
         if not isinstance(matrix, PolygonMatrix):
             raise TypeError("%s is not a PolygonMatrix" % matrix)
-        matrix *= self.get_transformation()
+        if self.deferred:
+            self._record("polygons", matrix, color)
+            return
+        matrix = matrix * self.matrix_stack.get_top()
         if self.view_vector:
             matrix = matrix.cull_faces(self.view_vector)
-        for triangle in matrix.get_rounded():
-            self._draw_line(
-                triangle[0][0], triangle[0][1], triangle[1][0], triangle[1][1],
-                color, z_depth=min(triangle[0][2], triangle[1][2]))
-            self._draw_line(
-                triangle[1][0], triangle[1][1], triangle[2][0], triangle[2][1],
-                color, z_depth=min(triangle[1][2], triangle[2][2]))
-            self._draw_line(
-                triangle[2][0], triangle[2][1], triangle[0][0], triangle[0][1],
-                color, z_depth=min(triangle[2][2], triangle[0][2]))
+        self._draw_triangles(matrix.get_rounded()._matrix().reshape(
+            -1, 3, 4)[:, :, :3], color)
 
     def fill_polygonmatrix(self, matrix, color=Color.BLACK()):
         """
@@ -376,26 +604,14 @@ class Drawing():
         """
         if not isinstance(matrix, PolygonMatrix):
             raise TypeError("%s is not a PolygonMatrix" % matrix)
-        matrix *= self.get_transformation()
+        if self.deferred:
+            self._record("fills", matrix, color)
+            return
+        matrix = matrix * self.matrix_stack.get_top()
         if self.view_vector:
             matrix = matrix.cull_faces(self.view_vector)
-        for triangle in matrix.get_rounded():
-            b = min(triangle, key=lambda point: point[1])
-            m = sorted(triangle, key=lambda point: point[1])[1]
-            t = max(triangle, key=lambda point: point[1])
-            z_depth = min(triangle, key=lambda point: point[2])
-            x1, x2 = b[0], b[0]
-            dx1 = (t[0] - b[0]) / float(t[1] - b[1]) if t[1] - b[1] else 0
-            dx2bm = (m[0] - b[0]) / float(m[1] - b[1]) if m[1] - b[1] else 0
-            dx2mt = (t[0] - m[0]) / float(t[1] - m[1]) if t[1] - m[1] else 0
-            for y in range(b[1], m[1] + 1):
-                self._draw_line(int(x1), y, int(x2), y, color, z_depth=z_depth)
-                x1 += dx1
-                x2 += dx2bm
-            for y in range(m[1], t[1] + 1):
-                self._draw_line(int(x1), y, int(x2), y, color, z_depth=z_depth)
-                x1 += dx1
-                x2 += dx2mt
+        self._fill_triangles(matrix.get_rounded()._matrix().reshape(
+            -1, 3, 4)[:, :, :3], color)
 
     def draw_point(self, x, y, z, color=Color.BLACK()):
         """
@@ -441,7 +657,7 @@ class Drawing():
         step: int (optional), the number of steps to use when drawing splines
         for the circle
         """
-        self.draw_edgematrix(Generator.get_circle_edgematrix(
+        self.draw_polylinematrix(Generator.get_circle_polylinematrix(
             center_x, center_y, radius, step=step), color)
 
     def draw_hermite_curve(self, p1, r1, p2, r2,
@@ -458,7 +674,7 @@ class Drawing():
         color: Color (optional), the color of the curve
         step: int (optional), the number of steps to use for drawing the curve
         """
-        self.draw_edgematrix(Generator.get_hermite_curve_edgematrix(
+        self.draw_polylinematrix(Generator.get_hermite_curve_polylinematrix(
             p1, r1, p2, r2, step=step), color)
 
     def draw_bezier_curve(self, p1, i1, i2, p2,
@@ -475,7 +691,7 @@ class Drawing():
         color: Color (optional), the color of the curve
         step: int (optional), the number of steps to use for drawing the curve
         """
-        self.draw_edgematrix(Generator.get_bezier_curve_edgematrix(
+        self.draw_polylinematrix(Generator.get_bezier_curve_polylinematrix(
             p1, i1, i2, p2, step=step), color)
 
     def draw_box_points(self, x, y, z, width, height, depth,
@@ -600,11 +816,36 @@ class Drawing():
             center_x, center_y, center_z, radius1, radius2,
             theta_step=theta_step, phi_step=phi_step), color)
 
+    def apply_kernel(self, kernel, section=None):
+        """
+        Applies an array kernel to a section of the internal raster, see
+        Picture.apply() and the Kernel class.
+
+        Parameters:
+        kernel: function, the kernel to apply
+        section: list (optional), opposite corners of a rectangular region
+            of the raster to apply the kernel to, the entire raster by default
+        """
+        self.flush()
+        self.picture.apply(kernel, section=section)
+
     def clear(self):
         """
-        Clears the internal raster, setting all pixels back to white.
+        Clears the internal raster, setting all pixels back to white and
+        resetting the depth buffer. Draw calls that have not been flushed yet
+        are discarded.
         """
+        self.commands = []
         self.picture.clear()
+        self.pixel_depths.clear()
+
+    def close(self):
+        """
+        Shuts down the processes used to rasterize lines and polygons, if
+        there are any. They are started again if anything else is drawn.
+        """
+        if self.tiler:
+            self.tiler.close()
 
     def display(self):
         """
@@ -616,7 +857,7 @@ class Drawing():
         system("display %s.ppm" % filename)
         remove("%s.ppm" % filename)
 
-    def generate(self, filename, extension="ppm"):
+    def generate(self, filename, extension="ppm", binary=True, compression=6):
         """
         Turns the internal raster into an image file.
 
@@ -624,9 +865,11 @@ class Drawing():
         filename: str, the name of the image file to generate
         extension: str (optional), the extension of the image file, defaults to
             ppm
-        """
-        self.picture.generate(filename)
-        full_filename = "%s.%s" % (filename, extension)
-        if extension != "ppm":
-            system("convert %s.ppm %s" % (filename, full_filename))
-            remove("%s.ppm" % filename)
+        binary: bool (optional), when set to True, ppm files are written in the
+            binary (P6) format, defaults to True
+        compression: int (optional), the zlib compression level used for png
+            files, defaults to 6
+        """
+        self.flush()
+        self.picture.generate(filename, extension=extension, binary=binary,
+                              compression=compression)
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# This is a class that manages a pool of background threads that encode
+# animation frames while the next frame is being drawn. Encoding is mostly
+# zlib and file IO, which release the GIL.
+# Author: Alvin Lin (alvin.lin.dev@gmail.com)
+
+from Queue import Queue
+from threading import Thread
+
+import traceback
+
+class EncoderPool():
+
+    def __init__(self, workers=2, max_pending=4):
+        """
+        Constructor for the EncoderPool class.
+
+        Parameters:
+        workers: int (optional), the number of encoding threads, defaults to 2.
+            Tasks are run in the order they were submitted if there is only one
+            worker.
+        max_pending: int (optional), the maximum number of tasks waiting to be
+            run, submit() blocks once this is reached, defaults to 4
+        """
+        if workers < 1:
+            raise ValueError("An EncoderPool needs at least one worker")
+        self.queue = Queue(maxsize=max_pending)
+        self.errors = []
+        self.threads = [Thread(target=self._work) for x in range(workers)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        """
+        Runs tasks from the queue until the stop signal (None) is received.
+        """
+        while True:
+            task = self.queue.get()
+            if task is None:
+                self.queue.task_done()
+                return
+            (function, args, kwargs) = task
+            try:
+                function(*args, **kwargs)
+            except Exception:
+                self.errors.append(traceback.format_exc())
+            finally:
+                self.queue.task_done()
+
+    def _check_errors(self):
+        """
+        Raises an error if any of the tasks run so far have failed.
+        """
+        if self.errors:
+            raise RuntimeError("Encoding failed:\n%s" % "\n".join(self.errors))
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queues a function to be run by one of the workers, blocking if the
+        queue is full.
+
+        Parameters:
+        function: function, the function to run
+        *args, the arguments to run the function with
+        **kwargs, the keyword arguments to run the function with
+        """
+        self._check_errors()
+        self.queue.put((function, args, kwargs))
+
+    def join(self):
+        """
+        Blocks until all the queued tasks have been run.
+        """
+        self.queue.join()
+        self._check_errors()
+
+    def close(self):
+        """
+        Runs all the queued tasks and stops the workers.
+        """
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self._check_errors()
+
+if __name__ == "__main__":
+    from time import sleep
+    pool = EncoderPool(workers=1)
+    for i in range(4):
+        pool.submit(sleep, 0.1)
+    pool.close()
@@ -6,7 +6,7 @@ from __future__ import division
 
 from decorators import accepts
 from parametric import Parametric
-from matrix import Matrix, EdgeMatrix, PolygonMatrix
+from matrix import Matrix, EdgeMatrix, PolylineMatrix, PolygonMatrix
 from util import Util
 
 from math import ceil, cos, sin, pi
@@ -50,6 +50,23 @@ class Generator():
         centered at the given points inscribed within a circle of the
         given radius.
 
+        Parameters:
+        center_x: int, the x coordinate of the center of the polygon
+        center_y: int, the y coordinate of the center of the polygon
+        radius: int, the radius of the circle
+        sides: int, the number of sides in the polygon
+        """
+        return Generator.get_polygon_polylinematrix(
+            center_x, center_y, radius, sides).to_edgematrix()
+
+    @staticmethod
+    @accepts((int, float), (int, float), (int, float), (int, float))
+    def get_polygon_polylinematrix(center_x, center_y, radius, sides):
+        """
+        Generates a closed PolylineMatrix representing a regular polygon
+        centered at the given points inscribed within a circle of the
+        given radius.
+
         Parameters:
         center_x: int, the x coordinate of the center of the polygon
         center_y: int, the y coordinate of the center of the polygon
@@ -60,12 +77,10 @@ class Generator():
         def y(t): return sin(t) * radius + center_y
         def z(t): return 0
         parametric = Parametric(x, y, z)
-        edgematrix = EdgeMatrix()
-        step_range = Generator.get_step_range(0, 2 * pi, sides)
-        for i in range(len(step_range) - 1):
-            edgematrix.add_edge(parametric.get_point(step_range[i]),
-                                parametric.get_point(step_range[i + 1]))
-        return edgematrix
+        polylinematrix = PolylineMatrix()
+        for t in Generator.get_step_range(0, 2 * pi, sides):
+            polylinematrix.add_point(parametric.get_point(t))
+        return polylinematrix
 
     @staticmethod
     @accepts((int, float), (int, float), (int, float))
@@ -83,6 +98,22 @@ class Generator():
         return Generator.get_polygon_edgematrix(
             center_x, center_y, radius, step)
 
+    @staticmethod
+    @accepts((int, float), (int, float), (int, float))
+    def get_circle_polylinematrix(center_x, center_y, radius, step=30):
+        """
+        Generates a closed PolylineMatrix representing a circle.
+
+        Parameters:
+        center_x: int, the x coordinate of the center of the circle
+        center_y: int, the y coordinate of the center of the circle
+        radius: int, the radius of the circle
+        step: int (optional), the number of steps to use when drawing splines
+            for the circle
+        """
+        return Generator.get_polygon_polylinematrix(
+            center_x, center_y, radius, step)
+
     @staticmethod
     @accepts((int, float), (int, float), (int, float), (int, float))
     def get_hermite_function(a, b, c, d):
@@ -105,6 +136,23 @@ class Generator():
         """
         Generates an EdgeMatrix of lines representing a hermite curve.
 
+        Parameters:
+        p1: list, the first point of the hermite curve
+        r1: list, the rate of change at p1
+        p2: list, the second point of the hermite curve
+        r2: list, the rate of change at p2
+        step: int (optional), the number of steps to use when drawing splines
+            for the hermite curve
+        """
+        return Generator.get_hermite_curve_polylinematrix(
+            p1, r1, p2, r2, step=step).to_edgematrix()
+
+    @staticmethod
+    @accepts(list, list, list, list)
+    def get_hermite_curve_polylinematrix(p1, r1, p2, r2, step=30):
+        """
+        Generates a PolylineMatrix representing a hermite curve.
+
         Parameters:
         p1: list, the first point of the hermite curve
         r1: list, the rate of change at p1
@@ -126,12 +174,10 @@ class Generator():
             c[0][1], c[1][1], c[2][1], c[3][1])(t)
         def z(t): return 0
         parametric = Parametric(x, y, z)
-        edgematrix = EdgeMatrix()
-        step_range = Generator.get_step_range(0, 1, step)
-        for i in range(len(step_range) - 1):
-            edgematrix.add_edge(parametric.get_point(step_range[i]),
-                                parametric.get_point(step_range[i + 1]))
-        return edgematrix
+        polylinematrix = PolylineMatrix()
+        for t in Generator.get_step_range(0, 1, step):
+            polylinematrix.add_point(parametric.get_point(t))
+        return polylinematrix
 
     @staticmethod
     @accepts((int, float), (int, float), (int, float), (int, float))
@@ -164,18 +210,33 @@ class Generator():
         step: int (optional), the number of steps to use when drawing splines
             for the hermite curve
         """
+        return Generator.get_bezier_curve_polylinematrix(
+            p1, i1, i2, p2, step=step).to_edgematrix()
+
+    @staticmethod
+    @accepts(list, list, list, list)
+    def get_bezier_curve_polylinematrix(p1, i1, i2, p2, step=30):
+        """
+        Generates a PolylineMatrix representing a bezier curve.
+
+        Parameters:
+        p1: list, the first endpoint of the bezier curve
+        i1: list, the first influence point of the bezier curve
+        i2: list, the second influence point of the bezier curve
+        p2: list, the second endpoint of the bezier curve
+        step: int (optional), the number of steps to use when drawing splines
+            for the bezier curve
+        """
         def x(t): return Generator.get_bezier_function(
             p1[0], i1[0], i2[0], p2[0])(t)
         def y(t): return Generator.get_bezier_function(
             p1[1], i1[1], i2[1], p2[1])(t)
         def z(t): return 0
         parametric = Parametric(x, y, z)
-        edgematrix = EdgeMatrix()
-        step_range = Generator.get_step_range(0, 1, step)
-        for i in range(len(step_range) - 1):
-            edgematrix.add_edge(parametric.get_point(step_range[i]),
-                                parametric.get_point(step_range[i + 1]))
-        return edgematrix
+        polylinematrix = PolylineMatrix()
+        for t in Generator.get_step_range(0, 1, step):
+            polylinematrix.add_point(parametric.get_point(t))
+        return polylinematrix
 
     @staticmethod
     @accepts((int, float), (int, float), (int, float), (int, float),
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+# This class holds static methods for generating array kernels that are
+# applied to the entire raster at once through Picture.apply().
+# Author: alvin.lin.dev@gmail.com (Alvin Lin)
+
+from color import Color
+
+import numpy as np
+
+class Kernel():
+
+    @staticmethod
+    def gamma(gamma):
+        """
+        Generates a kernel that applies gamma correction.
+
+        Parameters:
+        gamma: int or float, the gamma to correct for, values above 1 brighten
+            the image
+        """
+        def gamma_kernel(pixels, coordinates, dimensions):
+            return pixels ** (1.0 / gamma)
+        return gamma_kernel
+
+    @staticmethod
+    def invert():
+        """
+        Generates a kernel that inverts the colors.
+        """
+        def invert_kernel(pixels, coordinates, dimensions):
+            return 1 - pixels
+        return invert_kernel
+
+    @staticmethod
+    def grayscale():
+        """
+        Generates a kernel that converts the colors to their luminance.
+        """
+        def grayscale_kernel(pixels, coordinates, dimensions):
+            return np.dot(pixels, [0.299, 0.587, 0.114])[..., np.newaxis]
+        return grayscale_kernel
+
+    @staticmethod
+    def multiply(color):
+        """
+        Generates a kernel that multiplies the colors by the given color.
+
+        Parameters:
+        color: Color, the color to multiply by
+        """
+        if not isinstance(color, Color):
+            raise TypeError("%s is not a valid Color." % color)
+        factor = np.array(list(color)) / 255.0
+        def multiply_kernel(pixels, coordinates, dimensions):
+            return pixels * factor
+        return multiply_kernel
+
+    @staticmethod
+    def tone_map(exposure=1.0):
+        """
+        Generates a kernel that applies exposure followed by extended Reinhard
+        tone mapping, which compresses bright colors instead of clipping them.
+        White is used as the white point, so it is preserved.
+
+        Parameters:
+        exposure: int or float (optional), the exposure multiplier, defaults
+            to 1.0
+        """
+        def tone_map_kernel(pixels, coordinates, dimensions):
+            exposed = pixels * exposure
+            return exposed * (1 + exposed / (exposure * exposure)) / (
+                1 + exposed)
+        return tone_map_kernel
+
+    @staticmethod
+    def compose(*kernels):
+        """
+        Generates a kernel that applies the given kernels in order.
+
+        Parameters:
+        *kernels, the kernels to apply
+        """
+        def composed_kernel(pixels, coordinates, dimensions):
+            for kernel in kernels:
+                pixels = kernel(pixels, coordinates, dimensions)
+            return pixels
+        return composed_kernel
+
+    @staticmethod
+    def mask(mask, kernel):
+        """
+        Generates a kernel that blends the result of another kernel with the
+        original colors according to a mask.
+
+        Parameters:
+        mask: function, a callback that takes the x and y coordinate arrays and
+            the dimensions of the grid and returns an array of weights between
+            0 and 1 or of booleans, where 1 takes the result of the kernel
+        kernel: function, the kernel to apply through the mask
+        """
+        def mask_kernel(pixels, coordinates, dimensions):
+            weights = np.asarray(mask(coordinates[0], coordinates[1],
+                                      dimensions), dtype=float)
+            weights = weights[..., np.newaxis]
+            return (pixels * (1 - weights) +
+                    kernel(pixels, coordinates, dimensions) * weights)
+        return mask_kernel
+
+    @staticmethod
+    def vignette(strength=0.5):
+        """
+        Generates a kernel that darkens the colors towards the edges of the
+        grid.
+
+        Parameters:
+        strength: int or float (optional), the amount to darken the corners
+            by, defaults to 0.5
+        """
+        def vignette_kernel(pixels, coordinates, dimensions):
+            dx = coordinates[0] / float(dimensions[0]) - 0.5
+            dy = coordinates[1] / float(dimensions[1]) - 0.5
+            falloff = 1 - strength * 2 * (dx * dx + dy * dy)
+            return pixels * falloff[..., np.newaxis]
+        return vignette_kernel
+
+if __name__ == "__main__":
+    print Kernel.gamma(2.2)(np.array([0.25, 0.5, 1.0]), None, None)
@@ -2,31 +2,41 @@
 # This class encapsulates matrixes for graphics programming. The Matrix class
 # handles the base arithmetic operations associated with matrices while the
 # TransformationMatrix class generates transformation matrices to be applied
-# to sets of points. EdgeMatrix and PolygonMatrix are special subclasses of
-# the Matrix class that hold lines and polygons respectively.
+# to sets of points. EdgeMatrix, PolylineMatrix, and PolygonMatrix are special
+# subclasses of the Matrix class that hold lines, connected strips of lines,
+# and polygons respectively.
 # Author: Alvin Lin (alvin.lin.dev@gmail.com)
 
 from util import Util
 from vector import Vector
 
-from copy import deepcopy
 from math import pi, sin, cos
 
+import numpy as np
+
 class Matrix():
 
+    # The largest magnitude of a rounded coordinate, small enough that the
+    # difference between two rounded coordinates fits in an int32.
+    MAX_COORDINATE = 2 ** 30 - 1
+
     def __init__(self, matrix=None):
         """
         Constructor for the Matrix class. This class and its subclasses are
         used specifically to hold 4-tuples which represent points. You cannot
-        create a Matrix of any other length.
+        create a Matrix of any other length. The points are stored as the rows
+        of an Nx4 numpy array, so they can be transformed with a single
+        matrix multiplication. Multiplying a Matrix by a TransformationMatrix
+        only records the transformation, which is applied the first time the
+        points are needed, see transform().
 
         Parameters:
-        matrix, list (optional), a list of lists representing the internal state
-            of a Matrix
+        matrix, list (optional), a list of lists or an Nx4 numpy array
+            representing the internal state of a Matrix
         """
-        self.matrix = []
-        if matrix:
-            self.matrix = self._check_matrix(matrix)
+        self._set_matrix(np.empty((0, 4)))
+        if matrix is not None and len(matrix):
+            self._set_matrix(np.array(self._check_matrix(matrix), dtype=float))
 
     @staticmethod
     def _sanitize_point(point):
@@ -46,9 +56,23 @@ class Matrix():
             point += [1]
         return point
 
+    @staticmethod
+    def _has_points(matrix):
+        """
+        Returns True if every row of the given list or numpy array has
+        exactly four values.
+
+        Parameters:
+        matrix: list, the list or numpy array to check
+        """
+        if isinstance(matrix, np.ndarray):
+            return matrix.ndim == 2 and matrix.shape[1] == 4
+        return all([len(x) == 4 for x in matrix])
+
     def _preserve_type(self, matrix):
         """
-        Casts a list of lists to the type that this Matrix object is.
+        Casts a list of lists or a numpy array to the type that this Matrix
+        object is.
 
         Parameters:
         matrix: list, a representation of a Matrix to cast
@@ -57,6 +81,8 @@ class Matrix():
             return TransformationMatrix(matrix)
         elif isinstance(self, EdgeMatrix):
             return EdgeMatrix(matrix)
+        elif isinstance(self, PolylineMatrix):
+            return PolylineMatrix(matrix)
         elif isinstance(self, PolygonMatrix):
             return PolygonMatrix(matrix)
         return Matrix(matrix)
@@ -68,19 +94,74 @@ class Matrix():
         Parameters:
         matrix: list, the list to check
         """
-        if len(matrix) == 0 or all([len(x) == 4 for x in matrix]):
+        if Matrix._has_points(matrix):
             return matrix
         try:
             return map(self._sanitize_point, matrix)
         except TypeError:
             raise TypeError("%s is not a valid matrix representation" % matrix)
 
+    def _set_matrix(self, matrix):
+        """
+        Replaces the internal representation of this Matrix.
+
+        Parameters:
+        matrix: numpy.ndarray, the Nx4 array of points to hold
+        """
+        self.matrix = matrix
+        self.transformation = None
+        # Points are appended into the unused rows at the end of this buffer,
+        # which doubles in size when it is full.
+        self._buffer = matrix
+
+    def _append(self, points):
+        """
+        Appends points to the internal representation of this Matrix.
+
+        Parameters:
+        points: numpy.ndarray, an Nx4 array of the points to append
+        """
+        length = len(self._matrix())
+        size = length + len(points)
+        dtype = np.result_type(self._buffer, points)
+        if size > len(self._buffer) or dtype != self._buffer.dtype:
+            buffer = np.empty((max(size, 2 * len(self._buffer)), 4),
+                              dtype=dtype)
+            buffer[:length] = self.matrix
+            self._buffer = buffer
+        self._buffer[length:size] = points
+        self.matrix = self._buffer[:size]
+
     def _matrix(self):
         """
-        Returns the internal representation of this matrix as a list of lists.
+        Returns the internal representation of this matrix as an Nx4 numpy
+        array, after applying the pending transformation.
         """
+        if self.transformation is not None:
+            self._set_matrix(np.dot(self.matrix, self.transformation))
         return self.matrix
 
+    def transform(self, transformation):
+        """
+        Returns a copy of this Matrix with the given TransformationMatrix
+        applied. The transformation is composed with the pending
+        transformation of this Matrix, and the points are neither copied nor
+        transformed until they are needed.
+
+        Parameters:
+        transformation: TransformationMatrix, the transformation to apply
+        """
+        if not isinstance(transformation, TransformationMatrix):
+            raise TypeError("%s is not a TransformationMatrix" % (
+                transformation))
+        transformed = self.copy()
+        if transformed.transformation is None:
+            transformed.transformation = transformation._matrix().copy()
+        else:
+            transformed.transformation = np.dot(
+                transformed.transformation, transformation._matrix())
+        return transformed
+
     def add_point(self, point):
         """
         Adds a point to this Matrix's internal representation.
@@ -88,89 +169,110 @@ class Matrix():
         Parameters:
         point: list, the point to the add to this Matrix
         """
-        self.matrix += [Matrix._sanitize_point(point)]
+        self._append(np.array([Matrix._sanitize_point(point)], dtype=float))
         return self
 
     def clear(self):
         """
         Clears the matrix.
         """
-        self.matrix = []
+        self._set_matrix(np.empty((0, 4)))
 
     def copy(self):
         """
-        Returns a copy of the matrix.
+        Returns a copy of the matrix. The copy shares its points with this
+        Matrix until either of them is changed.
+        """
+        copy = self._preserve_type(None)
+        copy._set_matrix(self.matrix)
+        copy.transformation = self.transformation
+        return copy
+
+    @staticmethod
+    def round_points(points):
         """
-        return Matrix(self.matrix)
+        Returns the given coordinates rounded half away from zero, the same as
+        round(), as an int32 array. The coordinates are rounded in place, so
+        the given array is overwritten, and the only new array is the int32
+        array that they are cast into. Coordinates are clamped to
+        MAX_COORDINATE so that they cannot overflow.
+
+        Parameters:
+        points: numpy.ndarray, a float array of the coordinates to round
+        """
+        negative = np.signbit(points)
+        np.abs(points, out=points)
+        np.minimum(points, Matrix.MAX_COORDINATE, out=points)
+        points += 0.5
+        np.floor(points, out=points)
+        rounded = points.astype(np.int32)
+        np.negative(rounded, out=rounded, where=negative)
+        return rounded
 
     def get_rounded(self):
         """
-        Returns a copy of this Matrix where every value is rounded to the
-        nearest integer and is of type int.
+        Returns a copy of this Matrix where every value is rounded half away
+        from zero to the nearest integer, the same as round(), and held in an
+        int32 array. The pending transformation is applied into the temporary
+        array that is rounded, without being stored, and the copy is not
+        validated again.
         """
-        c = deepcopy(self.matrix)
-        for i in range(len(self.matrix)):
-            for j in range(len(self.matrix[i])):
-                c[i][j] = int(round(self.matrix[i][j]))
-        return self._preserve_type(c)
+        if self.transformation is None:
+            points = self.matrix.astype(float)
+        else:
+            points = np.dot(self.matrix, self.transformation)
+        rounded = self._preserve_type(None)
+        rounded._set_matrix(Matrix.round_points(points))
+        return rounded
 
     def __str__(self):
-        return str(self.matrix)
+        return str(self._matrix().tolist())
 
     def __iter__(self):
-        for item in self.matrix:
+        for item in self._matrix().tolist():
             yield item
 
     def __len__(self):
         return len(self.matrix)
 
     def __getitem__(self, index):
-        return self.matrix[index]
+        return self._matrix()[index]
 
     def __neg__(self):
-        for i in range(len(self.matrix)):
-            for j in range(len(self.matrix[i])):
-                self.matrix[i][j] *= -1
+        self._set_matrix(-self._matrix())
 
     def __add__(self, other):
         if isinstance(other, Matrix):
-            return Matrix(self.matrix + other.matrix)
+            return Matrix(np.concatenate([self._matrix(), other._matrix()]))
         raise TypeError("Cannot add %s to %s" % (self, other))
 
     def __mul__(self, other):
+        if isinstance(other, TransformationMatrix) and not isinstance(
+                self, TransformationMatrix):
+            return self.transform(other)
         if isinstance(other, Matrix) and len(self) > 0 and len(other) > 0:
-            if len(self[0]) == len(other.matrix):
-                result = [[0 for x in range(
-                    len(other.matrix[0]))] for y in range(len(self.matrix))]
-                for i in range(len(self.matrix)):
-                    for j in range(len(other.matrix[0])):
-                        result_row = 0
-                        for k in range(len(other.matrix)):
-                            result_row += self.matrix[i][k] * other.matrix[k][j]
-                        result[i][j] = result_row
-                return self._preserve_type(result)
+            if self.matrix.shape[1] == len(other.matrix):
+                return self._preserve_type(
+                    np.dot(self._matrix(), other._matrix()))
             raise TypeError(
                 "Matrices %s and %s cannot be multipled" % (self, other))
         raise TypeError("Cannot multiply %s and %s" % (other, self))
 
     def __iadd__(self, other):
         if isinstance(other, Matrix):
-            self.matrix += other.matrix
+            self._append(other._matrix())
             return self
         raise TypeError("Cannot add %s to %s" % (self, other))
 
     def __imul__(self, other):
+        if isinstance(other, TransformationMatrix) and not isinstance(
+                self, TransformationMatrix):
+            transformed = self.transform(other)
+            self.transformation = transformed.transformation
+            return self
         if isinstance(other, Matrix) and len(self) > 0 and len(other) > 0:
-            if len(self.matrix[0]) == len(other.matrix):
-                result = [[0 for x in range(
-                    len(other.matrix[0]))] for y in range(len(self.matrix))]
-                for i in range(len(self.matrix)):
-                    for j in range(len(other.matrix[0])):
-                        result_row = 0
-                        for k in range(len(other.matrix)):
-                            result_row += self.matrix[i][k] * other.matrix[k][j]
-                        result[i][j] = result_row
-                self.matrix = result
+            if self.matrix.shape[1] == len(other.matrix):
+                self._set_matrix(np.dot(self._matrix(), other._matrix()))
                 return self
             raise TypeError(
                 "Matrices %s and %s cannot be multipled" % (self, other))
@@ -178,6 +280,10 @@ class Matrix():
 
 
 class TransformationMatrix(Matrix):
+    # A TransformationMatrix holds an affine transformation, so its first three
+    # rows and columns are the linear part of the transformation and the first
+    # three values of its last row are the translation. Transformations are
+    # composed into these in place instead of multiplying 4x4 matrices.
 
     @staticmethod
     def identity():
@@ -198,7 +304,7 @@ class TransformationMatrix(Matrix):
         Parameters:
         matrix: list, the list to check
         """
-        if all([len(x) == 4 for x in matrix]) and len(matrix) == 4:
+        if Matrix._has_points(matrix) and len(matrix) == 4:
             return matrix
         raise TypeError("Invalid matrix: %s" % matrix)
 
@@ -218,7 +324,39 @@ class TransformationMatrix(Matrix):
         Parameters:
         matrix: Matrix, the matrix to multiply this matrix into.
         """
-        self.matrix = self._left_multiply(other).matrix
+        self._set_matrix(self._left_multiply(other).matrix)
+
+    def _set_matrix(self, matrix):
+        """
+        Replaces the internal representation of this TransformationMatrix and
+        updates the views of its linear part and translation.
+
+        Parameters:
+        matrix: numpy.ndarray, the 4x4 array to hold
+        """
+        Matrix._set_matrix(self, matrix)
+        if matrix.shape == (4, 4):
+            self.linear = matrix[:3, :3]
+            self.translation = matrix[3, :3]
+
+    def _rotate(self, first, second, theta, radians):
+        """
+        Applies a rotation from the first axis towards the second axis to this
+        TransformationMatrix. This is the same as left multiplying by the
+        rotation matrix, but only the two rows of the linear part that the
+        rotation mixes are recomputed.
+
+        Parameters:
+        first: int, the index of the axis to rotate from
+        second: int, the index of the axis to rotate towards
+        theta: float or int, the amount in degrees to rotate by
+        radians: bool, True if the parameter theta was specified in radians
+        """
+        if not radians:
+            theta = Util.d2r(theta)
+        (c, s) = (cos(theta), sin(theta))
+        rows = self.linear[first:second + 1:second - first]
+        rows[:] = np.dot(((c, s), (-s, c)), rows)
 
     def add_point(self, point):
         raise NotImplementedError(
@@ -242,13 +380,7 @@ class TransformationMatrix(Matrix):
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        if not radians:
-            theta = Util.d2r(theta)
-        self._ileft_multiply(TransformationMatrix([
-            [cos(theta), sin(theta), 0, 0],
-            [-sin(theta), cos(theta), 0, 0],
-            [0, 0, 1, 0],
-            [0, 0, 0, 1]]))
+        self._rotate(0, 1, theta, radians)
         return self
 
     def rotate_x_about_point(self, theta, x, y, z, radians=False):
@@ -281,13 +413,7 @@ class TransformationMatrix(Matrix):
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        if not radians:
-            theta = Util.d2r(theta)
-        self._ileft_multiply(TransformationMatrix([
-            [cos(theta), 0, sin(theta), 0],
-            [0, 1, 0, 0],
-            [-sin(theta), 0, cos(theta), 0],
-            [0, 0, 0, 1]]))
+        self._rotate(0, 2, theta, radians)
         return self
 
     def rotate_y_about_point(self, theta, x, y, z, radians=False):
@@ -320,13 +446,7 @@ class TransformationMatrix(Matrix):
         radians: bool (optional), set this to True if the parameter theta was
             specified in radians
         """
-        if not radians:
-            theta = Util.d2r(theta)
-        self._ileft_multiply(TransformationMatrix([
-            [1, 0, 0, 0],
-            [0, cos(theta), sin(theta), 0],
-            [0, -sin(theta), cos(theta), 0],
-            [0, 0, 0, 1]]))
+        self._rotate(1, 2, theta, radians)
         return self
 
     def rotate_z_about_point(self, theta, x, y, z, radians=False):
@@ -357,11 +477,7 @@ class TransformationMatrix(Matrix):
         y: int, the amount to translate in the y direction
         z: int, the amount to translate in the z direction
         """
-        self._ileft_multiply(TransformationMatrix([
-            [1, 0, 0, 0],
-            [0, 1, 0, 0],
-            [0, 0, 1, 0],
-            [x, y, z, 1]]))
+        self.translation += np.dot((x, y, z), self.linear)
         return self
 
     def scale(self, x, y, z):
@@ -374,11 +490,7 @@ class TransformationMatrix(Matrix):
         y: int or float, the amount to scale in the y direction
         z: int or float, the amount to scale in the z direction
         """
-        self._ileft_multiply(TransformationMatrix([
-            [x, 0, 0, 0],
-            [0, y, 0, 0],
-            [0, 0, z, 0],
-            [0, 0, 0, 1]]))
+        self.linear *= ((x,), (y,), (z,))
         return self
 
     def __add__(self, other):
@@ -397,7 +509,6 @@ class EdgeMatrix(Matrix):
             of an EdgeMatrix
         """
         Matrix.__init__(self, matrix)
-        self.counter = 0
 
     @staticmethod
     def create_from_pointmatrix(matrix):
@@ -405,10 +516,7 @@ class EdgeMatrix(Matrix):
         Returns an EdgeMatrix equivalent of a given Matrix of points. Used for
         drawing since each point will be represented as a line of length 1.
         """
-        edgematrix = EdgeMatrix()
-        for point in matrix:
-            edgematrix.add_edge(point, point)
-        return edgematrix
+        return EdgeMatrix(np.repeat(matrix._matrix(), 2, axis=0))
 
     def _check_matrix(self, matrix):
         """
@@ -420,7 +528,7 @@ class EdgeMatrix(Matrix):
         if len(matrix) % 2 != 0:
             raise TypeError(
                 "EdgeMatrix must be initialized with an even number of points")
-        if not all([len(x) == 4 for x in matrix]):
+        if not Matrix._has_points(matrix):
             raise TypeError(
                 "EdgeMatrix must be initialized with point lists of length 4")
         return matrix
@@ -429,12 +537,6 @@ class EdgeMatrix(Matrix):
         raise NotImplementedError(
             "You cannot call add_point() on an EdgeMatrix")
 
-    def copy(self):
-        """
-        Returns a copy of the matrix.
-        """
-        return EdgeMatrix(self.matrix)
-
     def add_edge(self, p1, p2):
         """
         Adds a line/edge to this EdgeMatrix.
@@ -444,23 +546,44 @@ class EdgeMatrix(Matrix):
         p2: list, a list representing the second endpoint of the line to add,
             can be in the form [x, y] or [x, y, z]
         """
-        self.matrix += [Matrix._sanitize_point(p1)]
-        self.matrix += [Matrix._sanitize_point(p2)]
+        self._append(np.array([Matrix._sanitize_point(p1),
+                               Matrix._sanitize_point(p2)], dtype=float))
         return self
 
     def __add__(self, other):
         raise NotImplementedError("You cannot call __add__() on an EdgeMatrix")
 
     def __iter__(self):
-        return self
+        for edge in self._matrix().reshape(-1, 2, 4).tolist():
+            yield edge
+
+
+class PolylineMatrix(Matrix):
+
+    def __init__(self, matrix=None):
+        """
+        Constructor for the PolylineMatrix class. A PolylineMatrix holds a
+        connected strip of lines, where each point is joined to the point
+        after it.
+
+        Parameters:
+        matrix, list (optional), a list of lists representing the internal state
+            of a PolylineMatrix
+        """
+        Matrix.__init__(self, matrix)
 
-    def next(self):
-        if self.counter > len(self) - 2:
-            self.counter = 0
-            raise StopIteration
-        edge = self.matrix[self.counter:self.counter + 2]
-        self.counter += 2
-        return edge
+    def to_edgematrix(self):
+        """
+        Returns an EdgeMatrix with a separate line for each segment of this
+        PolylineMatrix.
+        """
+        points = self._matrix()
+        return EdgeMatrix(np.stack(
+            [points[:-1], points[1:]], axis=1).reshape(-1, 4))
+
+    def __add__(self, other):
+        raise NotImplementedError(
+            "You cannot call __add__() on a PolylineMatrix")
 
 
 class PolygonMatrix(Matrix):
@@ -474,7 +597,6 @@ class PolygonMatrix(Matrix):
             of a PolygonMatrix
         """
         Matrix.__init__(self, matrix)
-        self.counter = 0
 
     def _check_matrix(self, matrix):
         """
@@ -487,7 +609,7 @@ class PolygonMatrix(Matrix):
             raise TypeError(
                 "The number of points in a PolygonMatrix must be a multiple" +
                 " of 3")
-        if not all([len(x) == 4 for x in matrix]):
+        if not Matrix._has_points(matrix):
             raise TypeError(
                 "PolygonMatrix must be initialized with lists of length 4")
         return matrix
@@ -496,12 +618,6 @@ class PolygonMatrix(Matrix):
         raise NotImplementedError(
             "You cannot call add_point() on a PolygonMatrix")
 
-    def copy(self):
-        """
-        Returns a copy of the matrix.
-        """
-        return PolygonMatrix(self.matrix)
-
     def add_polygon(self, p1, p2, p3):
         """
         Adds a triangle to this PolygonMatrix.
@@ -513,9 +629,9 @@ class PolygonMatrix(Matrix):
         p3: list, a list representing the third corner to add, can
             be in the form [x, y] or [x, y, z]
         """
-        self.matrix += [Matrix._sanitize_point(p1)]
-        self.matrix += [Matrix._sanitize_point(p2)]
-        self.matrix += [Matrix._sanitize_point(p3)]
+        self._append(np.array([Matrix._sanitize_point(p1),
+                               Matrix._sanitize_point(p2),
+                               Matrix._sanitize_point(p3)], dtype=float))
         return self
 
     def __add__(self, other):
@@ -523,15 +639,8 @@ class PolygonMatrix(Matrix):
             "You cannot call __add__() on a PolygonMatrix")
 
     def __iter__(self):
-        return self
-
-    def next(self):
-        if self.counter > len(self) - 3:
-            self.counter = 0
-            raise StopIteration
-        edge = self.matrix[self.counter:self.counter + 3]
-        self.counter += 3
-        return edge
+        for polygon in self._matrix().reshape(-1, 3, 4).tolist():
+            yield polygon
 
     def cull_faces(self, view_vector):
         """
@@ -542,22 +651,23 @@ class PolygonMatrix(Matrix):
         """
         if not isinstance(view_vector, Vector):
             raise TypeError("%s is not valid view Vector" % view_vector)
-        culled_polygonmatrix = PolygonMatrix()
-        for polygon in self:
-            v1 = Vector([
-                polygon[2][0] - polygon[0][0],
-                polygon[2][1] - polygon[0][1],
-                polygon[2][2] - polygon[0][2]
-            ])
-            v2 = Vector([
-                polygon[1][0] - polygon[0][0],
-                polygon[1][1] - polygon[0][1],
-                polygon[1][2] - polygon[0][2]
-            ])
-            normal = Vector.cross(v1, v2)
-            if Vector.dot(normal, view_vector) < 0:
-                culled_polygonmatrix.add_polygon(*polygon)
-        return culled_polygonmatrix
+        return PolygonMatrix(PolygonMatrix.get_visible_faces(
+            self._matrix().reshape(-1, 3, 4), view_vector).reshape(-1, 4))
+
+    @staticmethod
+    def get_visible_faces(polygons, view_vector):
+        """
+        Returns the given array of triangles minus all the faces that are not
+        visible to the view.
+
+        Parameters:
+        polygons: numpy.ndarray, an Nx3x3 or Nx3x4 array of the corners of
+            the triangles
+        view_vector: Vector, the view vector to cull in relation to
+        """
+        normals = np.cross(polygons[:, 2, :3] - polygons[:, 0, :3],
+                           polygons[:, 1, :3] - polygons[:, 0, :3])
+        return polygons[normals.dot(view_vector.vector[:3]) < 0]
 
 if __name__ == "__main__":
     a = Matrix()
@@ -1,38 +1,129 @@
 #!/usr/bin/python
 # Author: Alvin Lin (alvin.lin.dev@gmail.com)
 # This is a class that facilitates the generation of a raster ppm image file.
+# ppm and png files are encoded in-process, other image formats require
+# ImageMagick to be installed.
 # X increases down and y increases across.
 
 from color import Color
 from decorators import deprecated
 from util import Util
 
+from os import path, system, remove
+from mmap import mmap
+from struct import pack
+from zlib import compress, crc32
+
+import numpy as np
+
 class Picture():
 
     HEADER = "P3 %d %d %d\n"
+    BINARY_HEADER = "P6 %d %d %d\n"
+    PNG_SIGNATURE = "\x89PNG\r\n\x1a\n"
+    TILE_SIZE = 32
 
-    def __init__(self, width, height, max_color_value=255):
+    def __init__(self, width, height, max_color_value=255, mapped_file=None,
+                 shared=False):
         """
         Constructor for the Picture class.
 
         Parameters:
-        filename: str, the name of the new image file
         width: int, the width of the image in pixels
         height: int, the height of the image in pixels
         max_color_value: int, the max color value of the ppm, defaults to 255
+        mapped_file: str (optional), the name of a binary ppm file, excluding
+            the extension, to memory map the raster onto. Generating this file
+            only requires the mapping to be flushed.
+        shared: bool (optional), when set to True, the raster is allocated in
+            memory that is shared with child processes forked after this
+            Picture is created, a mapped raster is always shared
         """
         self.width = width
         self.height = height
         self.max_color_value = max_color_value
-        self.grid = [[Color("#FFFFFF") for x in range(
-            width)] for y in range(height)]
+        self.mapped_file = None
+        self.mapping = None
+        # The raster is stored as a contiguous array of RGB triplets indexed
+        # by [y, x, channel].
+        if mapped_file:
+            header = Picture.BINARY_HEADER % (width, height, max_color_value)
+            self.mapped_file = path.abspath("%s.ppm" % mapped_file)
+            self.mapping = np.memmap(
+                self.mapped_file, dtype=np.uint8, mode="w+",
+                shape=(len(header) + width * height * 3,))
+            self.grid = self.mapping[len(header):].reshape(height, width, 3)
+        elif shared:
+            self.grid = np.frombuffer(
+                mmap(-1, width * height * 3), dtype=np.uint8).reshape(
+                    height, width, 3)
+        else:
+            self.grid = np.empty((height, width, 3), dtype=np.uint8)
+        self.grid.fill(255)
+        # The raster is divided into square tiles. dirty_tiles keeps track of
+        # the tiles that have been drawn on since the last clear() and
+        # tile_versions stores the revision at which each tile last changed,
+        # which lets generate() reuse the encoded bytes of unchanged tiles.
+        tile_shape = (-(-height // Picture.TILE_SIZE),
+                      -(-width // Picture.TILE_SIZE))
+        self.dirty_tiles = np.zeros(tile_shape, dtype=bool)
+        self.tile_versions = np.zeros(tile_shape, dtype=np.int64)
+        self.revision = 1
+        self.encoded_tiles = {}
+
+    def copy(self):
+        """
+        Returns a snapshot of this Picture backed by its own raster in memory,
+        which can be encoded while this Picture continues to be drawn on. The
+        snapshot keeps the tile versions of this Picture and shares its cache
+        of encoded tiles, so tiles that did not change since a previous
+        snapshot was encoded are not encoded again.
+        """
+        picture = Picture(self.width, self.height, self.max_color_value)
+        np.copyto(picture.grid, self.grid)
+        np.copyto(picture.dirty_tiles, self.dirty_tiles)
+        np.copyto(picture.tile_versions, self.tile_versions)
+        picture.revision = self.revision
+        picture.encoded_tiles = self.encoded_tiles
+        # Anything drawn after this point is newer than the snapshot.
+        self.revision += 1
+        return picture
+
+    def mark_dirty(self, x1, y1, x2, y2):
+        """
+        Marks the tiles overlapping a rectangular region of the raster as
+        changed. This must be called after writing to the grid directly.
+
+        Parameters:
+        x1: int, the x coordinate of the top left corner of the region
+        y1: int, the y coordinate of the top left corner of the region
+        x2: int, the x coordinate of the bottom right corner of the region,
+            exclusive
+        y2: int, the y coordinate of the bottom right corner of the region,
+            exclusive
+        """
+        tiles = (slice(max(y1, 0) // Picture.TILE_SIZE,
+                       -(-min(y2, self.height) // Picture.TILE_SIZE)),
+                 slice(max(x1, 0) // Picture.TILE_SIZE,
+                       -(-min(x2, self.width) // Picture.TILE_SIZE)))
+        self.dirty_tiles[tiles] = True
+        self.tile_versions[tiles] = self.revision
 
     def clear(self):
         """
-        Sets all the pixels back to white.
+        Sets all the pixels back to white. Only the tiles that have been drawn
+        on since the last clear are reset.
         """
-        self.grid = [[Color("#FFFFFF") for x in range(
-            self.width)] for y in range(self.height)]
+        if self.dirty_tiles.all():
+            self.grid.fill(255)
+        else:
+            for (tile_y, tile_x) in np.argwhere(self.dirty_tiles):
+                self.grid[
+                    tile_y * Picture.TILE_SIZE:(tile_y + 1) * Picture.TILE_SIZE,
+                    tile_x * Picture.TILE_SIZE:(tile_x + 1) * Picture.TILE_SIZE
+                ] = 255
+        self.tile_versions[self.dirty_tiles] = self.revision
+        self.dirty_tiles.fill(False)
 
     def set_pixel(self, x, y, color):
         """
@@ -48,14 +139,62 @@ class Picture():
         if not isinstance(color, Color):
             raise TypeError("%s is not a valid Color." % color)
         try:
-            self.grid[y][x] = color
+            self.grid[y, x] = color.array
         except IndexError:
             raise ValueError("Invalid coordinate %d %d." % (x, y))
+        tile = (y // Picture.TILE_SIZE, x // Picture.TILE_SIZE)
+        self.dirty_tiles[tile] = True
+        self.tile_versions[tile] = self.revision
+
+    def apply(self, kernel, section=None):
+        """
+        Applies the given array kernel to a section of the grid in a single
+        vectorized call.
+
+        Parameters:
+        kernel: function, a callback function that takes an HxWx3 array of
+            the RGB values of the section as floats between 0 and 1, the x and
+            y coordinates of the section as arrays that broadcast against it,
+            and the dimensions of the grid, and returns an array of the new
+            RGB values that can be broadcast to the same shape
+        section: list (optional), opposite corners of a rectangular region
+            in the grid to apply the kernel to, the entire grid by default
+        """
+        (x1, y1, x2, y2) = (0, 0, self.width, self.height)
+        if section:
+            (x1, x2) = (max(min(section[0][0], section[1][0]), 0),
+                        min(max(section[0][0], section[1][0]), self.width))
+            (y1, y2) = (max(min(section[0][1], section[1][1]), 0),
+                        min(max(section[0][1], section[1][1]), self.height))
+        if x1 >= x2 or y1 >= y2:
+            return
+        region = self.grid[y1:y2, x1:x2]
+        (ys, xs) = np.ogrid[y1:y2, x1:x2]
+        result = kernel(region / 255.0, [xs, ys], [self.width, self.height])
+        region[...] = np.rint(np.clip(result, 0, 1) * 255)
+        self.mark_dirty(x1, y1, x2, y2)
+
+    def set_pixels(self, xs, ys, color):
+        """
+        Sets the specified pixels to the specified color.
+
+        Parameters:
+        xs: numpy.ndarray, the x coordinates of the pixels to set
+        ys: numpy.ndarray, the y coordinates of the pixels to set
+        color: Color, the RGB color to set the pixels to
+        """
+        if not isinstance(color, Color):
+            raise TypeError("%s is not a valid Color." % color)
+        self.grid[ys, xs] = color.array
+        tiles = (ys // Picture.TILE_SIZE, xs // Picture.TILE_SIZE)
+        self.dirty_tiles[tiles] = True
+        self.tile_versions[tiles] = self.revision
 
     @deprecated
     def map(self, function, section=None):
         """
         Applies the given function transformation to a section of the grid.
+        This calls the function once for every pixel, use apply() instead.
 
         Parameters:
         function: function, a callback function that is run on the pixels in
@@ -72,20 +211,221 @@ class Picture():
                        max(section[0][1], section[1][1])]
         for x in range(x_range[0], x_range[1]):
             for y in range(y_range[0], y_range[1]):
-                self.grid[x][y] = function(
-                    [x, y], [self.width, self.height], self.grid[x][y])
+                self.grid[x, y] = list(function(
+                    [x, y], [self.width, self.height],
+                    Color(self.grid[x, y].tolist())))
+        self.mark_dirty(0, 0, self.width, self.height)
+
+    def _get_tile(self, tile_y, tile_x):
+        """
+        Returns a view of the pixels in the specified tile.
+
+        Parameters:
+        tile_y: int, the row of the tile
+        tile_x: int, the column of the tile
+        """
+        return self.grid[
+            tile_y * Picture.TILE_SIZE:(tile_y + 1) * Picture.TILE_SIZE,
+            tile_x * Picture.TILE_SIZE:(tile_x + 1) * Picture.TILE_SIZE]
+
+    def _get_encoded_tiles(self, encoding, encode_tile):
+        """
+        Returns a grid of the encoded contents of every tile. Tiles that have
+        not changed since they were last encoded with the given encoding are
+        reused from the cache. A cached tile is only used if its version
+        matches, so snapshots encoded in other threads can share the cache.
+
+        Parameters:
+        encoding: str, the name of the encoding, used as the cache key
+        encode_tile: function, a callback that takes the row and column of a
+            tile and returns its encoded contents
+        """
+        (tile_rows, tile_columns) = self.tile_versions.shape
+        if encoding not in self.encoded_tiles:
+            self.encoded_tiles[encoding] = [
+                [(0, None)] * tile_columns for y in range(tile_rows)]
+        cache = self.encoded_tiles[encoding]
+        # Anything drawn after this point is newer than the cached encodings.
+        self.revision += 1
+        tiles = []
+        for tile_y in range(tile_rows):
+            tiles.append([])
+            for tile_x in range(tile_columns):
+                version = self.tile_versions[tile_y, tile_x]
+                tile = cache[tile_y][tile_x]
+                if tile[1] is None or tile[0] != version:
+                    tile = (version, encode_tile(tile_y, tile_x))
+                    cache[tile_y][tile_x] = tile
+                tiles[tile_y].append(tile[1])
+        return tiles
+
+    def _get_filtered_bands(self):
+        """
+        Returns the png filtered scanlines of each horizontal band of tiles.
+        Since the scanline filters depend on the previous row of pixels, a band
+        is only reused if neither it nor the band above it has changed.
+        """
+        tile_rows = self.tile_versions.shape[0]
+        if "png" not in self.encoded_tiles:
+            self.encoded_tiles["png"] = [(None, None)] * tile_rows
+        cache = self.encoded_tiles["png"]
+        self.revision += 1
+        band_versions = self.tile_versions.max(axis=1)
+        bands = []
+        for band in range(tile_rows):
+            key = (band_versions[band - 1] if band else 0, band_versions[band])
+            filtered = cache[band]
+            if filtered[0] != key:
+                start = band * Picture.TILE_SIZE
+                filtered = (key, Picture._filter_scanlines(
+                    self.grid[start:start + Picture.TILE_SIZE],
+                    self.grid[start - 1] if band else None).tobytes())
+                cache[band] = filtered
+            bands.append(filtered[1])
+        return bands
+
+    @staticmethod
+    def _png_chunk(chunk_type, data):
+        """
+        Returns a png chunk with its length and CRC.
+
+        Parameters:
+        chunk_type: str, the four letter type of the chunk
+        data: str, the contents of the chunk
+        """
+        return "%s%s%s%s" % (
+            pack(">I", len(data)), chunk_type, data,
+            pack(">I", crc32(data, crc32(chunk_type)) & 0xFFFFFFFF))
+
+    @staticmethod
+    def _filter_scanlines(raster, previous_row=None):
+        """
+        Applies the png scanline filters to the given raster and returns the
+        filtered scanlines, each prefixed with the type of the filter used. The
+        filter for each scanline is chosen with the minimum sum of absolute
+        differences heuristic recommended by the png specification.
+
+        Parameters:
+        raster: numpy.ndarray, an HxWx3 array of RGB values to filter
+        previous_row: numpy.ndarray (optional), the row of pixels directly
+            above the raster, None if the raster starts at the top of the image
+        """
+        height = raster.shape[0]
+        x = raster.reshape(height, -1).astype(np.int16)
+        # a, b, and c are the pixels to the left, above, and above and to the
+        # left of each byte respectively.
+        a = np.zeros_like(x)
+        a[:, 3:] = x[:, :-3]
+        b = np.zeros_like(x)
+        b[1:] = x[:-1]
+        c = np.zeros_like(x)
+        c[1:, 3:] = x[:-1, :-3]
+        if previous_row is not None:
+            b[0] = previous_row.ravel()
+            c[0, 3:] = b[0, :-3]
+        p = a + b - c
+        pa = np.abs(p - a)
+        pb = np.abs(p - b)
+        pc = np.abs(p - c)
+        paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+        filtered = np.array([
+            x, x - a, x - b, x - ((a + b) >> 1), x - paeth]).astype(np.uint8)
+        scores = np.abs(filtered.view(np.int8).astype(np.int32)).sum(axis=2)
+        filter_types = scores.argmin(axis=0)
+        scanlines = np.empty((height, x.shape[1] + 1), dtype=np.uint8)
+        scanlines[:, 0] = filter_types
+        scanlines[:, 1:] = filtered[filter_types, np.arange(height)]
+        return scanlines
+
+    def _is_mapped_file(self, filename):
+        """
+        Returns True if the ppm file with the given name is the file that the
+        internal raster is memory mapped onto.
+
+        Parameters:
+        filename: str, the name of the ppm file, excluding the extension
+        """
+        return self.mapped_file == path.abspath("%s.ppm" % filename)
+
+    def generate_ppm(self, filename, binary=True):
+        """
+        Writes the internal raster to a ppm image file. The file that the
+        internal raster is memory mapped onto can only be written as a binary
+        ppm, since it is the raster itself.
+
+        Parameters:
+        filename: str, the name of the image file, excluding the extension
+        binary: bool (optional), when set to True, writes a binary (P6) ppm
+            instead of a plaintext (P3) ppm, defaults to True
+        """
+        if self._is_mapped_file(filename):
+            if not binary:
+                raise ValueError(
+                    "%s.ppm is memory mapped and must be written as a binary "
+                    "ppm" % filename)
+            header = Picture.BINARY_HEADER % (
+                self.width, self.height, self.max_color_value)
+            self.mapping[:len(header)] = np.frombuffer(header, dtype=np.uint8)
+            self.mapping.flush()
+            return
+        with open("%s.ppm" % filename, "wb") as picture:
+            if binary:
+                picture.write(Picture.BINARY_HEADER % (
+                    self.width, self.height, self.max_color_value))
+                picture.write(self.grid.tobytes())
+            else:
+                tiles = self._get_encoded_tiles("ppm", lambda y, x: [
+                    " ".join(map(str, row.ravel().tolist()))
+                    for row in self._get_tile(y, x)])
+                picture.write(Picture.HEADER % (
+                    self.width, self.height, self.max_color_value))
+                picture.write("\n".join([
+                    " ".join(rows) for band in tiles for rows in zip(*band)]))
+
+    def generate_png(self, filename, compression=6):
+        """
+        Writes the internal raster to a png image file.
+
+        Parameters:
+        filename: str, the name of the image file, excluding the extension
+        compression: int (optional), the zlib compression level from 0 to 9,
+            defaults to 6
+        """
+        # The IHDR chunk holds the dimensions, a bit depth of 8, the truecolor
+        # color type, and the default compression, filter, and interlace
+        # methods.
+        header = pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        data = compress("".join(self._get_filtered_bands()), compression)
+        with open("%s.png" % filename, "wb") as picture:
+            picture.write("%s%s%s%s" % (
+                Picture.PNG_SIGNATURE,
+                Picture._png_chunk("IHDR", header),
+                Picture._png_chunk("IDAT", data),
+                Picture._png_chunk("IEND", "")))
 
-    def generate(self, filename):
+    def generate(self, filename, extension="ppm", binary=True, compression=6):
         """
-        Writes the internal raster to a ppm image file.
+        Writes the internal raster to an image file. Formats other than ppm and
+        png are converted from a temporary ppm file using ImageMagick.
 
         Parameters:
         filename: str, the name of the image file, excluding the extension
+        extension: str (optional), the extension of the image file, defaults to
+            ppm
+        binary: bool (optional), when set to True, ppm files are written in the
+            binary (P6) format, defaults to True
+        compression: int (optional), the zlib compression level used for png
+            files, defaults to 6
         """
-        with open("%s.ppm" % filename, "w") as picture:
-            picture.write(Picture.HEADER % (
-                self.width, self.height, self.max_color_value))
-            for row in self.grid:
-                for pixel in row:
-                    for color in pixel:
-                        picture.write("%d " % color)
+        if extension == "ppm":
+            self.generate_ppm(filename, binary=binary)
+        elif extension == "png":
+            self.generate_png(filename, compression=compression)
+        elif self._is_mapped_file(filename):
+            # The mapped file is converted in place and must not be removed.
+            self.generate_ppm(filename)
+            system("convert %s.ppm %s.%s" % (filename, filename, extension))
+        else:
+            self.generate_ppm(filename, binary=binary)
+            system("convert %s.ppm %s.%s" % (filename, filename, extension))
+            remove("%s.ppm" % filename)
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+# This class holds static methods that convert batches of primitives into
+# arrays of pixel coordinates and depths, which the Drawing class then writes
+# into the raster all at once.
+# Author: alvin.lin.dev@gmail.com (Alvin Lin)
+
+from __future__ import division
+
+import numpy as np
+
+class Rasterizer():
+
+    # The tolerance used when deciding whether a pixel center lies on an edge.
+    EPSILON = 1e-9
+
+    @staticmethod
+    def _expand(counts):
+        """
+        Given the number of pixels in each primitive, returns the index of the
+        primitive each pixel belongs to and the index of each pixel within its
+        primitive.
+
+        Parameters:
+        counts: numpy.ndarray, the number of pixels in each primitive
+        """
+        primitives = np.repeat(np.arange(len(counts)), counts)
+        starts = np.cumsum(counts) - counts
+        return (primitives, np.arange(counts.sum()) - starts[primitives])
+
+    @staticmethod
+    def get_nearest_pixels(xs, ys, z_depths, width):
+        """
+        Returns the x, y, and z coordinates of the given pixels with only the
+        nearest occurrence of every pixel that appears more than once. Of
+        pixels with equal depth, the one that appears last is kept, as it
+        would be if the pixels were drawn one at a time.
+
+        Parameters:
+        xs: numpy.ndarray, the x coordinates of the pixels
+        ys: numpy.ndarray, the y coordinates of the pixels
+        z_depths: numpy.ndarray, the depths of the pixels
+        width: int, the width of the raster
+        """
+        # Sort the pixels by position and then by depth, the nearest
+        # occurrence of each pixel is the last one in its group since the
+        # sort is stable.
+        indices = ys * width + xs
+        order = np.lexsort((z_depths, indices))
+        indices = indices[order]
+        nearest = order[np.append(indices[1:] != indices[:-1], True)]
+        return (xs[nearest], ys[nearest], z_depths[nearest])
+
+    @staticmethod
+    def get_line_steps(starts, ends):
+        """
+        Returns the number of steps that the given lines are rasterized in.
+
+        Parameters:
+        starts: numpy.ndarray, an Nx3 array of the first endpoints of the lines
+        ends: numpy.ndarray, an Nx3 array of the second endpoints of the lines
+        """
+        deltas = np.abs(ends[:, :2] - starts[:, :2])
+        return np.rint(deltas.max(axis=1)).astype(np.int64)
+
+    @staticmethod
+    def rasterize_lines(starts, ends, first_steps=None, last_steps=None):
+        """
+        Returns the x, y, and z coordinates of the pixels on the given lines.
+        Every line is stepped along its major axis, one pixel per step, and the
+        depth is interpolated between its endpoints.
+
+        Parameters:
+        starts: numpy.ndarray, an Nx3 array of the first endpoints of the lines
+        ends: numpy.ndarray, an Nx3 array of the second endpoints of the lines
+        first_steps: numpy.ndarray (optional), the first step of each line to
+            rasterize, defaults to the first endpoint
+        last_steps: numpy.ndarray (optional), the last step of each line to
+            rasterize, defaults to the second endpoint
+        """
+        deltas = ends - starts
+        steps = Rasterizer.get_line_steps(starts, ends)
+        if first_steps is None:
+            first_steps = np.zeros(len(steps), dtype=np.int64)
+        if last_steps is None:
+            last_steps = steps
+        (lines, offsets) = Rasterizer._expand(last_steps - first_steps + 1)
+        t = (first_steps[lines] + offsets) / np.maximum(
+            steps, 1).astype(float)[lines]
+        points = starts[lines] + deltas[lines] * t[:, np.newaxis]
+        xs = np.floor(points[:, 0] + 0.5).astype(np.int64)
+        ys = np.floor(points[:, 1] + 0.5).astype(np.int64)
+        return (xs, ys, points[:, 2])
+
+    @staticmethod
+    def _interpolate(p1, p2, y):
+        """
+        Returns the x and z coordinates of the points on the given segments at
+        the given heights. Horizontal segments return their first endpoint.
+
+        Parameters:
+        p1: numpy.ndarray, an Nx3 array of the first endpoints of the segments
+        p2: numpy.ndarray, an Nx3 array of the second endpoints of the segments
+        y: numpy.ndarray, the heights to interpolate at
+        """
+        dy = p2[:, 1] - p1[:, 1]
+        t = (y - p1[:, 1]) / np.where(dy == 0, 1, dy)
+        return (p1[:, 0] + (p2[:, 0] - p1[:, 0]) * t,
+                p1[:, 2] + (p2[:, 2] - p1[:, 2]) * t)
+
+    @staticmethod
+    def rasterize_spans(triangles, bounds=None, origin=(0, 0)):
+        """
+        Returns the x, y, and z coordinates of the pixels covered by the given
+        triangles using scanline conversion. The x extents and depths of every
+        row of every triangle are computed first, then each span is filled
+        with depths interpolated between its ends. A pixel is covered if its
+        center lies on or inside the triangle.
+
+        Parameters:
+        triangles: numpy.ndarray, an Nx3x3 array of the corners of the
+            triangles
+        bounds: list (optional), the width and height of a window to clip the
+            spans to, no clipping is done if it is not given
+        origin: list (optional), the x and y coordinates of the top left
+            corner of the window, defaults to the origin
+        """
+        # Sort the corners of every triangle into bottom, middle, and top.
+        order = np.argsort(triangles[:, :, 1], axis=1)
+        corners = triangles[np.arange(len(triangles))[:, np.newaxis], order]
+        (b, m, t) = (corners[:, 0], corners[:, 1], corners[:, 2])
+        first_rows = np.ceil(b[:, 1] - Rasterizer.EPSILON)
+        last_rows = np.floor(t[:, 1] + Rasterizer.EPSILON)
+        if bounds:
+            first_rows = np.maximum(first_rows, origin[1])
+            last_rows = np.minimum(last_rows, origin[1] + bounds[1] - 1)
+        rows = last_rows - first_rows + 1
+        (spans, offsets) = Rasterizer._expand(
+            np.maximum(rows, 0).astype(np.int64))
+        y = first_rows[spans] + offsets
+        (b, m, t) = (b[spans], m[spans], t[spans])
+        # One end of each span lies on the long edge from the bottom to the
+        # top corner, the other lies on one of the two short edges.
+        (x1, z1) = Rasterizer._interpolate(b, t, y)
+        upper = (y >= m[:, 1])[:, np.newaxis]
+        (x2, z2) = Rasterizer._interpolate(
+            np.where(upper, m, b), np.where(upper, t, m), y)
+        # Flat triangles span between their leftmost and rightmost corners.
+        flat = b[:, 1] == t[:, 1]
+        if flat.any():
+            flat_corners = corners[spans[flat]]
+            by_x = np.argsort(flat_corners[:, :, 0], axis=1)
+            index = np.arange(len(by_x))
+            left = flat_corners[index, by_x[:, 0]]
+            right = flat_corners[index, by_x[:, 2]]
+            (x1[flat], z1[flat]) = (left[:, 0], left[:, 2])
+            (x2[flat], z2[flat]) = (right[:, 0], right[:, 2])
+        swap = x2 < x1
+        (x1, x2) = (np.where(swap, x2, x1), np.where(swap, x1, x2))
+        (z1, z2) = (np.where(swap, z2, z1), np.where(swap, z1, z2))
+        starts = np.ceil(x1 - Rasterizer.EPSILON)
+        ends = np.floor(x2 + Rasterizer.EPSILON)
+        if bounds:
+            starts = np.maximum(starts, origin[0])
+            ends = np.minimum(ends, origin[0] + bounds[0] - 1)
+        lengths = ends - starts + 1
+        (pixels, offsets) = Rasterizer._expand(
+            np.maximum(lengths, 0).astype(np.int64))
+        xs = starts[pixels] + offsets
+        dx = (x2 - x1)[pixels]
+        zs = z1[pixels] + (z2 - z1)[pixels] * np.clip(
+            (xs - x1[pixels]) / np.where(dx == 0, 1, dx), 0, 1)
+        return (xs.astype(np.int64), y[pixels].astype(np.int64), zs)
+
+    @staticmethod
+    def rasterize_blocks(triangles, block_size=8, bounds=None, origin=(0, 0)):
+        """
+        Returns the x, y, and z coordinates of the pixels covered by the given
+        triangles using edge functions. The bounding box of every triangle is
+        divided into square blocks, and each of the three edge functions is
+        evaluated at the corners of every block. Blocks that are entirely
+        outside an edge are rejected and blocks that are entirely inside all
+        three edges are accepted without testing their pixels, so only the
+        blocks along the edges of a triangle are tested pixel by pixel. A pixel
+        is covered if its center lies on or inside the triangle, and its depth
+        is interpolated with barycentric coordinates. Triangles with no area
+        are skipped.
+
+        Parameters:
+        triangles: numpy.ndarray, an Nx3x3 array of the corners of the
+            triangles
+        block_size: int (optional), the width and height of the blocks,
+            defaults to 8
+        bounds: list (optional), the width and height of the raster, the
+            bounding boxes are clipped to it if it is given
+        origin: list (optional), the x and y coordinates of the top left
+            corner of the bounds, defaults to the origin
+        """
+        # The edge functions multiply coordinates together, which could
+        # overflow for integer coordinates far offscreen.
+        triangles = np.asarray(triangles, dtype=float)
+        (p0, p1, p2) = (triangles[:, 0], triangles[:, 1], triangles[:, 2])
+        area = ((p1[:, 0] - p0[:, 0]) * (p2[:, 1] - p0[:, 1]) -
+                (p1[:, 1] - p0[:, 1]) * (p2[:, 0] - p0[:, 0]))
+        keep = area != 0
+        (p0, p1, p2, area) = (p0[keep], p1[keep], p2[keep], area[keep])
+        # The edge function of each edge is a * x + b * y + c, which is
+        # positive on the inside of the triangle. Each edge is opposite the
+        # corner whose barycentric weight it computes, so the depth is also a
+        # linear function of x and y.
+        sign = np.sign(area)[:, np.newaxis]
+        starts = np.array([p1, p2, p0])
+        ends = np.array([p2, p0, p1])
+        a = (starts[:, :, 1] - ends[:, :, 1]).T * sign
+        b = (ends[:, :, 0] - starts[:, :, 0]).T * sign
+        c = (starts[:, :, 0] * ends[:, :, 1] -
+             starts[:, :, 1] * ends[:, :, 0]).T * sign
+        depths = np.array([p0[:, 2], p1[:, 2], p2[:, 2]]).T / np.abs(
+            area)[:, np.newaxis]
+        depth_plane = np.array([(a * depths).sum(axis=1),
+                                (b * depths).sum(axis=1),
+                                (c * depths).sum(axis=1)]).T
+        corners = np.array([p0, p1, p2])
+        low = np.ceil(corners.min(axis=0)[:, :2] - Rasterizer.EPSILON)
+        high = np.floor(corners.max(axis=0)[:, :2] + Rasterizer.EPSILON)
+        if bounds:
+            low = np.maximum(low, origin)
+            high = np.minimum(high, np.add(origin, bounds) - 1)
+        low = (low // block_size).astype(np.int64)
+        high = (high // block_size).astype(np.int64)
+        columns = np.maximum(high[:, 0] - low[:, 0] + 1, 0)
+        rows = np.maximum(high[:, 1] - low[:, 1] + 1, 0)
+        (owners, offsets) = Rasterizer._expand(columns * rows)
+        block_x = (low[owners, 0] + offsets % columns[owners]) * block_size
+        block_y = (low[owners, 1] + offsets // columns[owners]) * block_size
+        # Since the edge functions are linear, their extremes over a block are
+        # at the centers of its corner pixels.
+        (a, b, depth_plane) = (a[owners], b[owners], depth_plane[owners])
+        origins = (a * block_x[:, np.newaxis] + b * block_y[:, np.newaxis] +
+                   c[owners])
+        last = block_size - 1
+        lowest = origins + np.minimum(a * last, 0) + np.minimum(b * last, 0)
+        highest = origins + np.maximum(a * last, 0) + np.maximum(b * last, 0)
+        inside = (lowest >= -Rasterizer.EPSILON).all(axis=1)
+        outside = (highest < -Rasterizer.EPSILON).any(axis=1)
+        offsets = np.arange(block_size * block_size)
+        (dx, dy) = (offsets % block_size, offsets // block_size)
+        pixels = []
+        for (blocks, test) in ((inside, False), (~inside & ~outside, True)):
+            xs = block_x[blocks][:, np.newaxis] + dx
+            ys = block_y[blocks][:, np.newaxis] + dy
+            plane = depth_plane[blocks]
+            zs = (plane[:, 0:1] * xs + plane[:, 1:2] * ys + plane[:, 2:3])
+            if test:
+                covered = np.ones(xs.shape, dtype=bool)
+                for edge in range(3):
+                    covered &= (
+                        origins[blocks, edge:edge + 1] +
+                        a[blocks, edge:edge + 1] * dx +
+                        b[blocks, edge:edge + 1] * dy) >= -Rasterizer.EPSILON
+                (xs, ys, zs) = (xs[covered], ys[covered], zs[covered])
+            pixels.append((xs.ravel(), ys.ravel(), zs.ravel()))
+        return tuple([np.concatenate(coordinates)
+                      for coordinates in zip(*pixels)])
+
+if __name__ == "__main__":
+    print Rasterizer.rasterize_lines(np.array([[0., 0, 0], [5, 5, 5]]),
+                                     np.array([[4., 2, 4], [5, 5, 5]]))
+    print Rasterizer.rasterize_spans(np.array([[[0., 0, 0], [4, 0, 4],
+                                                [0, 2, 0]]]))
+    print Rasterizer.rasterize_blocks(np.array([[[0., 0, 0], [4, 0, 4],
+                                                 [0, 2, 0]]]), block_size=2)
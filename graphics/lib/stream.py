@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# This is a class that writes animation frames sequentially into a single
+# uncompressed video stream, either a file or stdout, so that it can be piped
+# directly into a video encoder.
+# Author: Alvin Lin (alvin.lin.dev@gmail.com)
+
+from picture import Picture
+
+from sys import stdout
+
+import numpy as np
+
+class FrameStream():
+
+    Y4M_HEADER = "YUV4MPEG2 W%d H%d F%d:1 Ip A1:1 C444\n"
+    Y4M_FRAME_HEADER = "FRAME\n"
+    CONTAINERS = ["y4m", "ppm"]
+    # The BT.601 conversion from RGB values between 0 and 255 to limited range
+    # YCbCr values.
+    YCBCR_TRANSFORM = np.array([
+        [65.481, 128.553, 24.966],
+        [-37.797, -74.203, 112.0],
+        [112.0, -93.786, -18.214]]) / 255.0
+    YCBCR_OFFSET = np.array([16, 128, 128])
+
+    def __init__(self, filename, width, height, frame_rate=24,
+                 container="y4m"):
+        """
+        Constructor for the FrameStream class.
+
+        Parameters:
+        filename: str, the name of the file to write the stream to, or - to
+            write the stream to stdout
+        width: int, the width of the frames in pixels
+        height: int, the height of the frames in pixels
+        frame_rate: int (optional), the number of frames per second, defaults
+            to 24
+        container: str (optional), y4m for a YUV4MPEG2 stream or ppm for a
+            stream of concatenated binary ppm frames, defaults to y4m
+        """
+        if container not in FrameStream.CONTAINERS:
+            raise ValueError("%s is not a valid container" % container)
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.frame_rate = frame_rate
+        self.container = container
+        self.frames = 0
+        if filename == "-":
+            self.stream = stdout
+        else:
+            self.stream = open(filename, "wb")
+        if container == "y4m":
+            self.stream.write(FrameStream.Y4M_HEADER % (
+                width, height, frame_rate))
+
+    def write_frame(self, picture):
+        """
+        Appends the raster of the given Picture to the stream as a frame.
+
+        Parameters:
+        picture: Picture, the frame to write
+        """
+        if not isinstance(picture, Picture):
+            raise TypeError("%s is not a Picture" % picture)
+        if picture.width != self.width or picture.height != self.height:
+            raise ValueError("Frame dimensions do not match the stream")
+        if self.container == "y4m":
+            ycbcr = np.dot(picture.grid, FrameStream.YCBCR_TRANSFORM.T)
+            ycbcr += FrameStream.YCBCR_OFFSET
+            planes = np.rint(ycbcr).astype(np.uint8).transpose(2, 0, 1)
+            self.stream.write(FrameStream.Y4M_FRAME_HEADER)
+            self.stream.write(np.ascontiguousarray(planes).tobytes())
+        else:
+            self.stream.write(Picture.BINARY_HEADER % (
+                self.width, self.height, picture.max_color_value))
+            self.stream.write(picture.grid.tobytes())
+        self.frames += 1
+
+    def close(self):
+        """
+        Flushes the stream and closes it if it is a file.
+        """
+        self.stream.flush()
+        if self.stream is not stdout:
+            self.stream.close()
+
+if __name__ == "__main__":
+    stream = FrameStream("-", 2, 2)
+    stream.write_frame(Picture(2, 2))
+    stream.close()
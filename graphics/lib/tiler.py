@@ -0,0 +1,224 @@
+#!/usr/bin/python
+# This class splits the raster into square tiles and rasterizes batches of
+# primitives in a pool of processes, one tile per task. The Picture and ZBuffer
+# must be allocated in shared memory so that the processes can write into them
+# directly. Every primitive is binned into the tiles its bounding box overlaps
+# and rasterized only within each of them, so no two processes ever write to
+# the same pixel.
+# Author: alvin.lin.dev@gmail.com (Alvin Lin)
+
+from clipper import Clipper
+from color import Color
+from rasterizer import Rasterizer
+from zbuffer import ZBuffer
+
+from multiprocessing import Pool
+
+import numpy as np
+
+# The Picture and ZBuffer of the worker processes, which are inherited from
+# the parent process when the pool is forked.
+_buffers = {}
+
+def _initialize(picture, pixel_depths):
+    """
+    Stores the shared Picture and ZBuffer in a new worker process.
+
+    Parameters:
+    picture: Picture, the Picture to draw to
+    pixel_depths: ZBuffer, the depth buffer of the Picture
+    """
+    _buffers["picture"] = picture
+    _buffers["pixel_depths"] = pixel_depths
+
+def _rasterize_tile(task):
+    """
+    Rasterizes a batch of primitives into a single tile of the shared raster
+    and returns the coordinates of one written pixel in every tile of the
+    bottom level of the depth pyramid that was written to, or None if no
+    pixels were written.
+
+    Parameters:
+    task: tuple, the kind of primitives, either lines or triangles, the x and y
+        coordinates of the top left corner of the tile, its width and height,
+        the primitives, the first step of each line, the rgb values of their
+        color, the generation of the depth buffer, and the fill engine to fill
+        triangles with
+    """
+    (kind, x, y, width, height, primitives, first_steps, rgb, generation,
+     fill_engine) = task
+    (picture, pixel_depths) = (_buffers["picture"], _buffers["pixel_depths"])
+    # The primitives are clipped to the tile without moving their vertices,
+    # so their pixels and depths are the same as when they are drawn by a
+    # single process.
+    if kind == "lines":
+        pixels = Rasterizer.rasterize_lines(*Clipper.clip_lines(
+            primitives[:, 0], primitives[:, 1], [width, height], [x, y],
+            first_steps))
+    elif fill_engine == "halfspace":
+        pixels = Rasterizer.rasterize_blocks(
+            primitives, bounds=[width, height], origin=[x, y])
+    else:
+        pixels = Rasterizer.rasterize_spans(
+            primitives, bounds=[width, height], origin=[x, y])
+    (xs, ys, z_depths) = pixels
+    inside = (xs >= x) & (xs < x + width) & (ys >= y) & (ys < y + height)
+    if not inside.any():
+        return None
+    (xs, ys, z_depths) = Rasterizer.get_nearest_pixels(
+        xs[inside], ys[inside], z_depths[inside], picture.width)
+    pixel_depths.generation = generation
+    passed = pixel_depths.test_and_set_pixels(
+        xs, ys, z_depths, update_pyramid=False)
+    if not passed.any():
+        return None
+    picture.set_pixels(xs[passed], ys[passed], Color(rgb))
+    tiles = np.unique(((ys[passed] >> ZBuffer.TILE_SHIFT) << 32) |
+                      (xs[passed] >> ZBuffer.TILE_SHIFT))
+    return ((tiles & 0xFFFFFFFF) << ZBuffer.TILE_SHIFT,
+            (tiles >> 32) << ZBuffer.TILE_SHIFT)
+
+class TileRasterizer():
+
+    # The width and height of the tiles in pixels, which must be a multiple of
+    # the tile sizes of the Picture and the ZBuffer.
+    TILE_SIZE = 128
+
+    def __init__(self, picture, pixel_depths, processes):
+        """
+        Constructor for the TileRasterizer class.
+
+        Parameters:
+        picture: Picture, the shared Picture to draw to
+        pixel_depths: ZBuffer, the shared depth buffer of the Picture
+        processes: int, the number of processes to rasterize tiles with
+        """
+        self.picture = picture
+        self.pixel_depths = pixel_depths
+        self.processes = processes
+        self.pool = None
+
+    def _get_pool(self):
+        """
+        Returns the pool of processes, creating it on first use.
+        """
+        if self.pool is None:
+            self.pool = Pool(self.processes, initializer=_initialize,
+                             initargs=(self.picture, self.pixel_depths))
+        return self.pool
+
+    def _bin(self, low, high):
+        """
+        Returns the x and y coordinates of the tiles overlapped by the given
+        bounding boxes and the indices of the primitives in each tile, in the
+        order they were given.
+
+        Parameters:
+        low: numpy.ndarray, an Nx2 array of the minimum pixel coordinates of
+            the bounding boxes of the primitives
+        high: numpy.ndarray, an Nx2 array of the maximum pixel coordinates of
+            the bounding boxes of the primitives
+        """
+        bounds = np.array([self.picture.width, self.picture.height]) - 1
+        low = np.clip(low, 0, bounds).astype(np.int64)
+        onscreen = (high >= 0).all(axis=1) & (low <= bounds).all(axis=1)
+        high = np.clip(high, 0, bounds).astype(np.int64)
+        low = low // TileRasterizer.TILE_SIZE
+        high = high // TileRasterizer.TILE_SIZE
+        columns = np.where(onscreen, high[:, 0] - low[:, 0] + 1, 0)
+        rows = np.where(onscreen, high[:, 1] - low[:, 1] + 1, 0)
+        (primitives, offsets) = Rasterizer._expand(columns * rows)
+        if len(primitives) == 0:
+            return []
+        tile_xs = low[primitives, 0] + offsets % columns[primitives]
+        tile_ys = low[primitives, 1] + offsets // columns[primitives]
+        tiles = (tile_ys << 32) | tile_xs
+        order = np.argsort(tiles, kind="mergesort")
+        (tiles, primitives) = (tiles[order], primitives[order])
+        starts = np.flatnonzero(np.append(True, tiles[1:] != tiles[:-1]))
+        return [((tiles[start] & 0xFFFFFFFF) * TileRasterizer.TILE_SIZE,
+                 (tiles[start] >> 32) * TileRasterizer.TILE_SIZE, indices)
+                for (start, indices) in zip(
+                    starts, np.split(primitives, starts[1:]))]
+
+    def _rasterize(self, kind, primitives, first_steps, low, high, color,
+                   fill_engine):
+        """
+        Rasterizes a batch of primitives tile by tile in the pool of processes
+        and updates the bookkeeping of the Picture and ZBuffer afterwards.
+
+        Parameters:
+        kind: str, the kind of primitives, either lines or triangles
+        primitives: numpy.ndarray, an NxMx3 array of the corners of the
+            primitives
+        first_steps: numpy.ndarray, the first step of each line, or None
+        low: numpy.ndarray, an Nx2 array of the minimum pixel coordinates of
+            the bounding boxes of the primitives
+        high: numpy.ndarray, an Nx2 array of the maximum pixel coordinates of
+            the bounding boxes of the primitives
+        color: Color, the color to draw the primitives with
+        fill_engine: str, the rasterizer used to fill triangles
+        """
+        tasks = []
+        for (x, y, indices) in self._bin(low, high):
+            width = min(TileRasterizer.TILE_SIZE, self.picture.width - x)
+            height = min(TileRasterizer.TILE_SIZE, self.picture.height - y)
+            tasks.append((
+                kind, x, y, width, height, primitives[indices],
+                None if first_steps is None else first_steps[indices],
+                color.color, self.pixel_depths.generation, fill_engine))
+        if not tasks:
+            return
+        results = self._get_pool().map(_rasterize_tile, tasks)
+        written = []
+        for (task, result) in zip(tasks, results):
+            if result is not None:
+                (x, y, width, height) = task[1:5]
+                self.picture.mark_dirty(x, y, x + width, y + height)
+                written.append(result)
+        if written:
+            (xs, ys) = zip(*written)
+            self.pixel_depths._update_pyramid(np.concatenate(xs),
+                                              np.concatenate(ys))
+
+    def rasterize_lines(self, starts, ends, color, first_steps=None):
+        """
+        Draws a batch of lines on the shared raster.
+
+        Parameters:
+        starts: numpy.ndarray, an Nx3 array of the first endpoints of the lines
+        ends: numpy.ndarray, an Nx3 array of the second endpoints of the lines
+        color: Color, the color of the lines
+        first_steps: numpy.ndarray (optional), the first step of each line to
+            draw, see Rasterizer.rasterize_lines()
+        """
+        # Points on the lines are rounded to the nearest pixel.
+        low = np.floor(np.minimum(starts, ends)[:, :2] + 0.5)
+        high = np.floor(np.maximum(starts, ends)[:, :2] + 0.5)
+        self._rasterize("lines", np.stack([starts, ends], axis=1),
+                        first_steps, low, high, color, None)
+
+    def rasterize_triangles(self, triangles, color, fill_engine):
+        """
+        Fills a batch of triangles on the shared raster.
+
+        Parameters:
+        triangles: numpy.ndarray, an Nx3x3 array of the corners of the
+            triangles
+        color: Color, the color to fill the triangles with
+        fill_engine: str, the rasterizer used to fill the triangles, either
+            scanline or halfspace
+        """
+        low = np.floor(triangles.min(axis=1)[:, :2])
+        high = np.ceil(triangles.max(axis=1)[:, :2])
+        self._rasterize("triangles", triangles, None, low, high, color,
+                        fill_engine)
+
+    def close(self):
+        """
+        Shuts down the pool of processes.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
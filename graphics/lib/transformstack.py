@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# This is a class that manages the stack of TransformationMatrix objects used by
+# the Drawing class. Every level of the stack holds the composed transformation
+# along with a version number that is incremented whenever the level changes.
+# Matrices derived from a level, such as its inverse and the matrix used to
+# transform normals, are cached with the version they were computed at, so
+# they are only recomputed after the level changes.
+# Author: Alvin Lin (alvin.lin.dev@gmail.com)
+
+from matrix import TransformationMatrix
+
+import numpy as np
+
+class TransformStack():
+
+    def __init__(self):
+        """
+        Constructor for the TransformStack class. The stack starts with a
+        single level holding the identity matrix.
+        """
+        self.matrices = [TransformationMatrix.identity()]
+        self.versions = [0]
+        # Each level maps the name of a derived matrix to the version it was
+        # computed at and its value.
+        self.caches = [{}]
+
+    def __len__(self):
+        return len(self.matrices)
+
+    def push(self):
+        """
+        Pushes a copy of the top level onto the stack. The new level shares
+        the cached matrices of the level below it until it is changed.
+        """
+        self.matrices.append(self.matrices[-1].copy())
+        self.versions.append(self.versions[-1])
+        self.caches.append(dict(self.caches[-1]))
+
+    def pop(self):
+        """
+        Pops the top level off the stack. If it is the only level, it is reset
+        to the identity matrix instead.
+        """
+        if len(self.matrices) == 1:
+            self.set_top(TransformationMatrix.identity())
+            return
+        self.matrices.pop()
+        self.versions.pop()
+        self.caches.pop()
+
+    def get_top(self):
+        """
+        Returns the TransformationMatrix at the top of the stack. It must not
+        be changed, see modify_top().
+        """
+        return self.matrices[-1]
+
+    def modify_top(self):
+        """
+        Returns the TransformationMatrix at the top of the stack so that it
+        can be changed in place, and invalidates the matrices cached for it.
+        """
+        self.versions[-1] += 1
+        return self.matrices[-1]
+
+    def set_top(self, matrix):
+        """
+        Replaces the TransformationMatrix at the top of the stack.
+
+        Parameters:
+        matrix: TransformationMatrix, the new top of the stack
+        """
+        self.matrices[-1] = matrix
+        self.versions[-1] += 1
+
+    def _get_cached(self, name, compute):
+        """
+        Returns a matrix derived from the top of the stack, computing it only
+        if the top has changed since it was last cached. The returned array
+        is read only since it is shared between callers.
+
+        Parameters:
+        name: str, the name of the derived matrix
+        compute: function, computes the derived matrix from the 4x4 array of
+            the top of the stack
+        """
+        (version, cache) = (self.versions[-1], self.caches[-1])
+        if name not in cache or cache[name][0] != version:
+            value = compute(self.matrices[-1]._matrix())
+            value.flags.writeable = False
+            cache[name] = (version, value)
+        return cache[name][1]
+
+    def get_matrix(self):
+        """
+        Returns the 4x4 array of the composed transformation at the top of the
+        stack.
+        """
+        return self._get_cached("matrix", np.array)
+
+    def get_inverse(self):
+        """
+        Returns the 4x4 array of the inverse of the composed transformation at
+        the top of the stack.
+        """
+        return self._get_cached("inverse", np.linalg.inv)
+
+    def get_normal_matrix(self):
+        """
+        Returns the 3x3 array that transforms normal vectors by the composed
+        transformation at the top of the stack, which is the inverse transpose
+        of its linear part. Normals are row vectors, the same as points.
+        """
+        return self._get_cached(
+            "normal", lambda matrix: np.linalg.inv(matrix[:3, :3]).T)
+
+
+if __name__ == "__main__":
+    stack = TransformStack()
+    stack.modify_top().scale(2, 4, 8)
+    print stack.get_inverse()
+    stack.push()
+    print stack.get_normal_matrix() is stack.get_normal_matrix()
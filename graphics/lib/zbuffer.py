@@ -0,0 +1,190 @@
+#!/usr/bin/python
+# This is a class that manages the depth buffer of the Drawing class. Every
+# pixel stores its depth and the frame generation it was written in, so the
+# buffer can be reset for a new frame by incrementing the generation instead of
+# rewriting every pixel. Depths from previous generations are treated as -inf.
+# A pyramid of the minimum depth of progressively larger tiles is kept on top
+# of the buffer, so that primitives that are entirely behind what has already
+# been drawn can be rejected before they are rasterized.
+# Author: Alvin Lin (alvin.lin.dev@gmail.com)
+
+from mmap import mmap
+
+import numpy as np
+
+class ZBuffer():
+
+    MAX_GENERATION = np.iinfo(np.uint32).max
+    # The size of the tiles at the bottom level of the pyramid, as a power of 2.
+    TILE_SHIFT = 3
+
+    def __init__(self, width, height, shared=False):
+        """
+        Constructor for the ZBuffer class.
+
+        Parameters:
+        width: int, the width of the buffer in pixels
+        height: int, the height of the buffer in pixels
+        shared: bool (optional), when set to True, the depths of the pixels
+            are allocated in memory that is shared with child processes forked
+            after this ZBuffer is created
+        """
+        self.width = width
+        self.height = height
+        if shared:
+            self.depths = np.frombuffer(mmap(-1, width * height * 8),
+                                        dtype=np.float64).reshape(height, width)
+            self.generations = np.frombuffer(
+                mmap(-1, width * height * 4), dtype=np.uint32).reshape(
+                    height, width)
+        else:
+            self.depths = np.empty((height, width), dtype=np.float64)
+            self.generations = np.empty((height, width), dtype=np.uint32)
+        self.depths.fill(float("-inf"))
+        self.generations.fill(0)
+        self.generation = 1
+        # Each level of the pyramid stores the minimum depth of its tiles and
+        # the generation it was computed in. Every level halves the resolution
+        # of the level below it, up to a single tile covering the buffer.
+        self.levels = []
+        shift = ZBuffer.TILE_SHIFT
+        while True:
+            shape = (-(-height >> shift), -(-width >> shift))
+            self.levels.append((np.empty(shape, dtype=np.float64),
+                                np.zeros(shape, dtype=np.uint32)))
+            if shape == (1, 1):
+                break
+            shift += 1
+
+    def clear(self):
+        """
+        Resets the depth of every pixel to -inf.
+        """
+        self.generation += 1
+        if self.generation == ZBuffer.MAX_GENERATION:
+            self.generations.fill(0)
+            for (depths, generations) in self.levels:
+                generations.fill(0)
+            self.generation = 1
+
+    def _get_tile_depths(self, level, tile_ys, tile_xs):
+        """
+        Returns the minimum depths of the specified tiles of a level of the
+        pyramid. Tiles from previous generations have a depth of -inf.
+
+        Parameters:
+        level: int, the level of the pyramid
+        tile_ys: numpy.ndarray, the rows of the tiles
+        tile_xs: numpy.ndarray, the columns of the tiles
+        """
+        (depths, generations) = self.levels[level]
+        return np.where(generations[tile_ys, tile_xs] == self.generation,
+                        depths[tile_ys, tile_xs], float("-inf"))
+
+    def _update_pyramid(self, xs, ys):
+        """
+        Recomputes the minimum depths of the tiles containing the given pixels
+        at every level of the pyramid.
+
+        Parameters:
+        xs: numpy.ndarray, the x coordinates of the pixels that changed
+        ys: numpy.ndarray, the y coordinates of the pixels that changed
+        """
+        size = 1 << ZBuffer.TILE_SHIFT
+        columns = self.levels[0][0].shape[1]
+        tiles = np.unique((ys >> ZBuffer.TILE_SHIFT) * columns +
+                          (xs >> ZBuffer.TILE_SHIFT))
+        (tile_ys, tile_xs) = (tiles // columns, tiles % columns)
+        # Pixels past the edges of the buffer are replaced by the last row or
+        # column, which does not change the minimum.
+        offsets = np.arange(size * size)
+        pixel_ys = np.minimum((tile_ys << ZBuffer.TILE_SHIFT)[:, np.newaxis] +
+                              offsets // size, self.height - 1)
+        pixel_xs = np.minimum((tile_xs << ZBuffer.TILE_SHIFT)[:, np.newaxis] +
+                              offsets % size, self.width - 1)
+        depths = np.where(
+            self.generations[pixel_ys, pixel_xs] == self.generation,
+            self.depths[pixel_ys, pixel_xs], float("-inf")).min(axis=1)
+        for level in range(len(self.levels)):
+            if level:
+                (rows, columns) = self.levels[level - 1][0].shape
+                parent_columns = self.levels[level][0].shape[1]
+                tiles = np.unique((tile_ys >> 1) * parent_columns +
+                                  (tile_xs >> 1))
+                (tile_ys, tile_xs) = (tiles // parent_columns,
+                                      tiles % parent_columns)
+                child_ys = np.minimum(
+                    (tile_ys << 1)[:, np.newaxis] + [0, 0, 1, 1], rows - 1)
+                child_xs = np.minimum(
+                    (tile_xs << 1)[:, np.newaxis] + [0, 1, 0, 1], columns - 1)
+                depths = self._get_tile_depths(
+                    level - 1, child_ys, child_xs).min(axis=1)
+            self.levels[level][0][tile_ys, tile_xs] = depths
+            self.levels[level][1][tile_ys, tile_xs] = self.generation
+
+    def get_hidden(self, x1s, y1s, x2s, y2s, z_depths):
+        """
+        Returns a boolean array of the given rectangles that are entirely behind
+        the depths already in the buffer. For each rectangle, the smallest
+        level of the pyramid whose tiles are at least as large as the rectangle
+        is used, so at most four tiles are checked per rectangle.
+
+        Parameters:
+        x1s: numpy.ndarray, the minimum x coordinates of the rectangles
+        y1s: numpy.ndarray, the minimum y coordinates of the rectangles
+        x2s: numpy.ndarray, the maximum x coordinates of the rectangles
+        y2s: numpy.ndarray, the maximum y coordinates of the rectangles
+        z_depths: numpy.ndarray, the nearest depth inside each rectangle
+        """
+        hidden = np.zeros(len(z_depths), dtype=bool)
+        onscreen = (x2s >= 0) & (x1s < self.width) & (y2s >= 0) & (
+            y1s < self.height)
+        x1s = np.clip(x1s, 0, self.width - 1).astype(np.int64)
+        y1s = np.clip(y1s, 0, self.height - 1).astype(np.int64)
+        x2s = np.clip(x2s, 0, self.width - 1).astype(np.int64)
+        y2s = np.clip(y2s, 0, self.height - 1).astype(np.int64)
+        extents = np.maximum(x2s - x1s, y2s - y1s) + 1
+        levels = np.ceil(np.log2(np.maximum(
+            extents, 1) / float(1 << ZBuffer.TILE_SHIFT)))
+        levels = np.clip(levels, 0, len(self.levels) - 1).astype(np.int64)
+        for level in np.unique(levels[onscreen]):
+            selected = onscreen & (levels == level)
+            shift = ZBuffer.TILE_SHIFT + level
+            tile_ys = np.array([y1s[selected] >> shift, y2s[selected] >> shift])
+            tile_xs = np.array([x1s[selected] >> shift, x2s[selected] >> shift])
+            depths = np.minimum(
+                self._get_tile_depths(level, tile_ys, tile_xs).min(axis=0),
+                self._get_tile_depths(level, tile_ys, tile_xs[::-1]).min(
+                    axis=0))
+            hidden[selected] = z_depths[selected] < depths
+        return hidden
+
+    def test_and_set_pixels(self, xs, ys, z_depths, update_pyramid=True):
+        """
+        Sets the depths of the specified distinct pixels where the given depth
+        is greater than or equal to their current depth. Returns a boolean
+        array of the pixels that passed the depth test.
+
+        Parameters:
+        xs: numpy.ndarray, the x coordinates of the pixels
+        ys: numpy.ndarray, the y coordinates of the pixels
+        z_depths: numpy.ndarray, the depths to test
+        update_pyramid: bool (optional), when set to False, the pyramid is
+            left for the caller to update with _update_pyramid()
+        """
+        passed = (self.generations[ys, xs] != self.generation) | (
+            z_depths >= self.depths[ys, xs])
+        (ys, xs) = (ys[passed], xs[passed])
+        self.depths[ys, xs] = z_depths[passed]
+        self.generations[ys, xs] = self.generation
+        if update_pyramid and len(xs):
+            self._update_pyramid(xs, ys)
+        return passed
+
+if __name__ == "__main__":
+    zbuffer = ZBuffer(2, 2)
+    (xs, ys) = (np.array([0, 1]), np.array([0, 0]))
+    print zbuffer.test_and_set_pixels(xs, ys, np.array([5.0, 5.0]))
+    print zbuffer.test_and_set_pixels(xs, ys, np.array([4.0, 6.0]))
+    zbuffer.clear()
+    print zbuffer.test_and_set_pixels(xs, ys, np.array([4.0, 4.0]))
@@ -6,11 +6,16 @@ import graphics.compiler.mdl as mdl
 
 from graphics.lib.color import Color
 from graphics.lib.drawing import Drawing
+from graphics.lib.encoder import EncoderPool
 from graphics.lib.generator import Generator
 from graphics.lib.matrix import Matrix, TransformationMatrix, EdgeMatrix
+from graphics.lib.stream import FrameStream
 from graphics.lib.util import Util
 
+from sys import stderr
+
 import argparse
+import os
 import traceback
 
 class Runner():
@@ -18,7 +23,9 @@ class Runner():
     DEFAULT_FRAMECOUNT = 60
 
     def __init__(self, width=512, height=512, color="#FF0000",
-                 directory="", verbose=False):
+                 directory="", verbose=False, extension="ppm", stream=None,
+                 container="y4m", frame_rate=24, workers=2, processes=1,
+                 deferred=False):
         """
         Constructor for the Runner class.
 
@@ -27,13 +34,35 @@ class Runner():
         height: int (optional), the height of the image to generate
         color: string (optional), the hexadecimal representation of the color to
             use when drawing
+        extension: string (optional), the image format of the generated
+            animation frames, defaults to ppm
+        stream: string (optional), the name of a file to write all the
+            animation frames to as a single video stream instead of one image
+            file per frame, - for stdout
+        container: string (optional), the container format of the stream,
+            either y4m or ppm, defaults to y4m
+        frame_rate: int (optional), the frame rate of the stream, defaults to
+            24
+        workers: int (optional), the number of background threads that encode
+            animation frames while the next frame is drawn, 0 to encode each
+            frame before drawing the next one, defaults to 2
+        processes: int (optional), the number of processes that rasterize
+            each frame, split by screen tiles, defaults to 1
+        deferred: bool (optional), when set to True, the draw calls of each
+            frame are recorded and drawn together in one batch
         """
         self.width = width
         self.height = height
-        self.drawing = Drawing(width, height)
+        self.drawing = Drawing(width, height, processes=processes,
+                               deferred=deferred)
         self.color = Color(color)
         self.directory = directory
         self.verbose = verbose
+        self.extension = extension
+        self.stream = stream
+        self.container = container
+        self.frame_rate = frame_rate
+        self.workers = workers
 
         self.frames = Runner.DEFAULT_FRAMECOUNT
         self.basename = "%s/default_basename" % self.directory.strip("/")
@@ -74,6 +103,21 @@ class Runner():
             self.knobs[knob_name] = Generator.get_knob_range(
                 self.frames, from_frame, to_frame, from_value, to_value)
 
+    def save(self, filename=None):
+        """
+        Saves the current drawing to an image file. The image format is
+        determined by the extension of the filename.
+
+        Parameters:
+        filename: str (optional), the name of the image file, defaults to the
+            basename of the animation
+        """
+        if filename:
+            (filename, extension) = os.path.splitext(filename)
+        else:
+            (filename, extension) = (self.basename, "")
+        self.drawing.generate(filename, extension.lstrip(".") or self.extension)
+
     def run(self, filename):
         """
         Reads the given file, compiles the code found in it, and runs it.
@@ -110,7 +154,7 @@ class Runner():
             "sphere": { "function": self.drawing.draw_sphere, "params": 4 },
             "torus": { "function": self.drawing.draw_torus, "params": 5 },
             "display": { "function": self.drawing.display, "params": 0 },
-            "save": { "function": self.drawing.generate, "params": 1 }
+            "save": { "function": self.save, "params": 1 }
         }
         commands = None
         symbols = None
@@ -136,6 +180,19 @@ class Runner():
             if self.knobs:
                 # If we are animating, then save is no longer a valid command.
                 del drawing_commands["save"]
+                stream = None
+                if self.stream:
+                    stream = FrameStream(
+                        self.stream, self.width, self.height,
+                        frame_rate=self.frame_rate, container=self.container)
+                # Frames are snapshotted and encoded in the background while
+                # the next frame is drawn. Streamed frames must be written in
+                # order, so they are handled by a single worker.
+                encoder = None
+                if self.workers:
+                    encoder = EncoderPool(
+                        workers=1 if stream else self.workers,
+                        max_pending=self.workers * 2)
                 for frame in range(self.frames):
                     for command in commands:
                         name = command[0]
@@ -158,13 +215,33 @@ class Runner():
                             args = command[1:][
                                 :drawing_commands[name]["params"]]
                             drawing_commands[name]["function"](*args)
-                    # Generate an image file for each frame.
+                    # Append the frame to the stream if there is one,
+                    # otherwise generate an image file for each frame.
+                    self.drawing.flush()
+                    if stream:
+                        if encoder:
+                            encoder.submit(stream.write_frame,
+                                           self.drawing.picture.copy())
+                        else:
+                            stream.write_frame(self.drawing.picture)
+                        self.drawing.clear()
+                        if self.verbose:
+                            print >> stderr, "Streamed frame %d" % frame
+                        continue
                     filename = "%s_%s" % (self.basename, str(frame).zfill(
                         len(str(self.frames))))
-                    self.drawing.generate(filename)
+                    if encoder:
+                        encoder.submit(self.drawing.picture.copy().generate,
+                                       filename, self.extension)
+                    else:
+                        self.drawing.generate(filename, self.extension)
                     self.drawing.clear()
                     if self.verbose:
                         print "Generated %s" % filename
+                if encoder:
+                    encoder.close()
+                if stream:
+                    stream.close()
             else:
                 # If we are not animating, then just run all the commands.
                 for command in commands:
@@ -176,8 +253,8 @@ class Runner():
                         # This line extracts the necessary parameters from the
                         # command by checking how many parameters this function
                         # takes.
-                        args = command[1:][:drawing_commands][name]["params"]
-                        drawing_commands[name](*args)
+                        args = command[1:][:drawing_commands[name]["params"]]
+                        drawing_commands[name]["function"](*args)
         except:
             print "Execution failed."
             print traceback.format_exc()
@@ -189,7 +266,26 @@ if __name__ == "__main__":
     argparser.add_argument("file", help="The mdl file to run")
     argparser.add_argument("--verbose", action="store_true")
     argparser.add_argument("--dir", type=str, default=".")
+    argparser.add_argument("--format", type=str, default="ppm",
+                           help="The image format of animation frames")
+    argparser.add_argument("--stream", type=str, default=None,
+                           help="A file to stream frames to, - for stdout")
+    argparser.add_argument("--container", type=str, default="y4m",
+                           choices=FrameStream.CONTAINERS,
+                           help="The container format of the stream")
+    argparser.add_argument("--fps", type=int, default=24,
+                           help="The frame rate of the stream")
+    argparser.add_argument("--workers", type=int, default=2,
+                           help="The number of frame encoding threads")
+    argparser.add_argument("--processes", type=int, default=1,
+                           help="The number of rasterizing processes")
+    argparser.add_argument("--deferred", action="store_true",
+                           help="Draw each frame in one batch")
     args = argparser.parse_args()
 
-    runner = Runner(directory=args.dir, verbose=args.verbose)
+    runner = Runner(directory=args.dir, verbose=args.verbose,
+                    extension=args.format, stream=args.stream,
+                    container=args.container, frame_rate=args.fps,
+                    workers=args.workers, processes=args.processes,
+                    deferred=args.deferred)
     runner.run(args.file)